@@ -1,16 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import os
-import shutil
+import json
+import queue
+import hashlib
+import threading
+import uuid
 from pathlib import Path
+from typing import List
 from dotenv import load_dotenv
 
-from services.video_analyzer import VideoAnalyzer
-from services.audio_analyzer import AudioAnalyzer
-from services.content_analyzer import ContentAnalyzer
-from services.llm_service import LLMService
-from services.thumbnail_suggester import ThumbnailSuggester
+from services.analysis import (
+    run_analysis,
+    run_multi_analysis,
+    result_cache,
+    media_cache,
+    transcript_cache,
+    preview_store,
+    CACHE_DIR
+)
+from services.result_cache import json_default
+from services.content_analyzer import whisper_pool, chunked_whisper, transcription_backend
+from services.thumbnail_suggester import parallel_scorer
+from services.face_detector import face_detector
+from services.job_queue import JobQueue, JobStore, QueueFullError
 
 load_dotenv()
 
@@ -29,13 +44,90 @@ app.add_middleware(
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Background analysis jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 10))
+# Job states live in CACHE_DIR, so with several server processes or replicas sharing
+# it, a status poll can be answered by any of them. The job itself runs in the
+# process that received the upload
+job_queue = JobQueue(
+    run_analysis,
+    num_workers=JOB_WORKERS,
+    max_queued=JOB_QUEUE_SIZE,
+    store=JobStore(CACHE_DIR / "jobs.sqlite3")
+)
+
+@app.on_event("startup")
+def preload_models():
+    # Pay the Whisper load once at boot rather than on the first upload
+    if os.getenv("WHISPER_PRELOAD", "false").lower() == "true":
+        whisper_pool.preload()
+        print(f"✅ Whisper '{transcription_backend.model_id}' ready ({whisper_pool.loaded} instance(s))")
+        if chunked_whisper.enabled:
+            chunked_whisper.preload()
+            print(f"✅ Chunked transcription ready ({chunked_whisper.workers} worker(s))")
+    # Face detection models are small; load them before the first upload
+    face_detector.preload()
+    if face_detector.available:
+        print(f"✅ Face detector '{face_detector.kind}' ready ({face_detector.pool.loaded} instance(s))")
+    # Spawned workers take a moment to import OpenCV; start them before the first upload
+    if parallel_scorer.enabled:
+        parallel_scorer.preload()
+        print(f"✅ Thumbnail scoring ready ({parallel_scorer.workers} worker(s))")
+
 @app.get("/")
 def root():
     return {"message": "AI Reel Optimizer API", "status": "running"}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "llm_provider": os.getenv("LLM_PROVIDER", "ollama")}
+    return {
+        "status": "healthy",
+        "llm_provider": os.getenv("LLM_PROVIDER", "ollama"),
+        "result_cache": result_cache.stats(),
+        "media_cache": media_cache.stats(),
+        "transcript_cache": transcript_cache.stats(),
+        "preview_store": preview_store.stats(),
+        "whisper": {
+            "model": transcription_backend.model_id,
+            "loaded": whisper_pool.loaded,
+            "pool_size": whisper_pool.size,
+            "chunk_workers": chunked_whisper.workers
+        },
+        "thumbnail_workers": parallel_scorer.workers,
+        "face_detector": {
+            "kind": face_detector.kind,
+            "available": face_detector.available,
+            "loaded": face_detector.pool.loaded,
+            "pool_size": face_detector.pool.size
+        }
+    }
+
+@app.get("/api/previews/{name}")
+def get_preview(name: str, request: Request):
+    """Serve a thumbnail preview; names are content hashes, so responses never go stale"""
+    path = preview_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    
+    etag = preview_store.etag(name)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=preview_store.media_type(name), headers=headers)
+
+def _save_upload(upload: UploadFile, destination: Path) -> str:
+    """Stream upload to disk, returning the SHA-256 of its contents"""
+    digest = hashlib.sha256()
+    with open(destination, "wb") as buffer:
+        while True:
+            chunk = upload.file.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
 
 @app.post("/api/analyze")
 async def analyze_video(
@@ -59,59 +151,135 @@ async def analyze_video(
         raise HTTPException(status_code=400, detail="File must be a video")
     
     # Save video temporarily
-    video_path = UPLOAD_DIR / f"temp_{video.filename}"
+    video_path = UPLOAD_DIR / f"temp_{uuid.uuid4().hex}_{Path(video.filename).name}"
     try:
         print("💾 Saving video...")
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-        print(f"✅ Video saved to {video_path}")
-        
-        # Initialize analyzers
-        print("\n🔧 Initializing analyzers...")
-        video_analyzer = VideoAnalyzer(str(video_path))
-        audio_analyzer = AudioAnalyzer(str(video_path))
-        content_analyzer = ContentAnalyzer(str(video_path))
-        llm_service = LLMService()
-        
-        # Run analysis
-        print("\n🎥 Analyzing video...")
-        video_metrics = video_analyzer.analyze()
-        print(f"✅ Video metrics: {video_metrics}")
+        content_hash = await run_in_threadpool(_save_upload, video, video_path)
+        print(f"✅ Video saved to {video_path} (sha256 {content_hash[:12]})")
         
-        print("\n🔊 Analyzing audio...")
-        audio_metrics = audio_analyzer.analyze()
-        print(f"✅ Audio metrics: {audio_metrics}")
+        # Run the analyzer stage graph off the event loop so other requests keep flowing
+        suggestions = await run_in_threadpool(run_analysis, str(video_path), platform, content_hash)
         
-        print("\n📝 Transcribing content...")
-        transcript = content_analyzer.transcribe()
-        print(f"✅ Transcript: {transcript.get('text', 'No speech')[:100]}...")
-        
-        # Get LLM insights
-        print("\n🤖 Generating AI suggestions...")
-        suggestions = llm_service.generate_suggestions(
-            video_metrics=video_metrics,
-            audio_metrics=audio_metrics,
-            transcript=transcript,
-            platform=platform
-        )
-        print(f"✅ Suggestions generated: {suggestions.get('overall_score', 'N/A')}")
+        print(f"\n{'='*60}")
+        print("✨ Analysis complete!")
+        print(f"{'='*60}\n")
         
-        # Generate thumbnail suggestions
-        print("\n🖼️  Generating thumbnail suggestions...")
+        return JSONResponse(content=suggestions)
+    
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    finally:
+        # Cleanup
+        if video_path.exists():
+            print(f"🗑️  Cleaning up {video_path}")
+            video_path.unlink()
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+def _stream_analysis(video_path: Path, platform: str, content_hash: str):
+    """Run the analysis in a background thread and yield its partial results as SSE"""
+    events: "queue.Queue" = queue.Queue()
+    
+    # Serialize at emit time; analyzers keep mutating their dicts afterwards
+    def emit(event, data):
+        events.put(_sse_event(event, data))
+    
+    def worker():
         try:
-            thumbnail_suggester = ThumbnailSuggester(str(video_path), platform)
-            thumbnail_suggestions = thumbnail_suggester.generate_suggestions(num_suggestions=5)
-            suggestions['thumbnail_suggestions'] = thumbnail_suggestions
-            print(f"✅ Generated {len(thumbnail_suggestions)} thumbnail suggestions")
+            run_analysis(str(video_path), platform, content_hash, emit=emit)
         except Exception as e:
-            print(f"⚠️  Thumbnail generation failed: {str(e)}")
-            suggestions['thumbnail_suggestions'] = []
+            print(f"\n❌ ERROR: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            emit("error", {"detail": f"Analysis failed: {str(e)}"})
+        finally:
+            if video_path.exists():
+                print(f"🗑️  Cleaning up {video_path}")
+                video_path.unlink()
+            events.put(None)
+    
+    threading.Thread(target=worker, name="analysis-stream", daemon=True).start()
+    
+    while True:
+        item = events.get()
+        if item is None:
+            break
+        yield item
+    yield _sse_event("done", {})
+
+@app.post("/api/analyze/stream")
+async def analyze_video_stream(
+    video: UploadFile = File(...),
+    platform: str = Form(...)
+):
+    """
+    Analyze uploaded video, streaming typed Server-Sent Events as each stage completes
+    """
+    print(f"\n{'='*60}")
+    print(f"🎬 New streaming analysis request")
+    print(f"📱 Platform: {platform}")
+    print(f"📹 File: {video.filename}")
+    print(f"{'='*60}\n")
+    
+    if platform not in ["instagram", "youtube_shorts", "other"]:
+        raise HTTPException(status_code=400, detail="Invalid platform")
+    
+    if not video.content_type.startswith("video/"):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    
+    video_path = UPLOAD_DIR / f"temp_{uuid.uuid4().hex}_{Path(video.filename).name}"
+    print("💾 Saving video...")
+    content_hash = await run_in_threadpool(_save_upload, video, video_path)
+    print(f"✅ Video saved to {video_path} (sha256 {content_hash[:12]})")
+    
+    return StreamingResponse(
+        _stream_analysis(video_path, platform, content_hash),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/analyze/multi")
+async def analyze_video_multi(
+    video: UploadFile = File(...),
+    platforms: List[str] = Form(...)
+):
+    """
+    Analyze uploaded video once and return optimization suggestions for each platform
+    """
+    # Accept repeated form fields as well as a comma-separated list
+    platforms = [p.strip() for value in platforms for p in value.split(",") if p.strip()]
+    platforms = list(dict.fromkeys(platforms))
+    
+    print(f"\n{'='*60}")
+    print(f"🎬 New multi-platform analysis request")
+    print(f"📱 Platforms: {', '.join(platforms)}")
+    print(f"📹 File: {video.filename}")
+    print(f"{'='*60}\n")
+    
+    if not platforms or any(p not in ["instagram", "youtube_shorts", "other"] for p in platforms):
+        raise HTTPException(status_code=400, detail="Invalid platform")
+    
+    if not video.content_type.startswith("video/"):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    
+    video_path = UPLOAD_DIR / f"temp_{uuid.uuid4().hex}_{Path(video.filename).name}"
+    try:
+        print("💾 Saving video...")
+        content_hash = await run_in_threadpool(_save_upload, video, video_path)
+        print(f"✅ Video saved to {video_path} (sha256 {content_hash[:12]})")
+        
+        results = await run_in_threadpool(run_multi_analysis, str(video_path), platforms, content_hash)
         
         print(f"\n{'='*60}")
-        print("✨ Analysis complete!")
+        print("✨ Multi-platform analysis complete!")
         print(f"{'='*60}\n")
         
-        return JSONResponse(content=suggestions)
+        return JSONResponse(content={"results": results})
     
     except Exception as e:
         print(f"\n❌ ERROR: {str(e)}")
@@ -120,11 +288,64 @@ async def analyze_video(
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
     
     finally:
-        # Cleanup
         if video_path.exists():
             print(f"🗑️  Cleaning up {video_path}")
             video_path.unlink()
 
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    video: UploadFile = File(...),
+    platform: str = Form(...)
+):
+    """
+    Store uploaded video and queue it for analysis, returning a job id immediately
+    """
+    if platform not in ["instagram", "youtube_shorts", "other"]:
+        raise HTTPException(status_code=400, detail="Invalid platform")
+    
+    if not video.content_type.startswith("video/"):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    
+    # Refuse before saving the upload when there is no room. FastAPI has already
+    # received the body by the time this runs, so this saves disk writes, not bandwidth
+    if job_queue.is_full():
+        retry_after = job_queue.retry_after()
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, please retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
+    video_path = UPLOAD_DIR / f"job_{uuid.uuid4().hex}_{Path(video.filename).name}"
+    content_hash = await run_in_threadpool(_save_upload, video, video_path)
+    
+    try:
+        job = job_queue.submit(video_path, platform, content_hash)
+    except QueueFullError as e:
+        video_path.unlink()
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    print(f"📥 Queued job {job.id} for {video.filename} ({platform})")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}"
+    }
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Return status of a queued analysis job, including results once completed
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
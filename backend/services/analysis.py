@@ -0,0 +1,386 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from services.video_analyzer import VideoAnalyzer
+from services.audio_analyzer import AudioAnalyzer, SILENCE_THRESH_DB, MIN_SILENCE_MS
+from services.content_analyzer import (
+    ContentAnalyzer,
+    TRANSCRIBE_VAD,
+    VAD_MERGE_GAP_MS,
+    VAD_PADDING_MS,
+    transcription_backend
+)
+from services.llm_service import LLMService
+from services.thumbnail_suggester import (
+    ThumbnailSuggester,
+    THUMBNAIL_SAMPLING,
+    THUMBNAIL_COARSE_INTERVAL,
+    THUMBNAIL_REFINE_SEEDS,
+    THUMBNAIL_MIN_DISTANCE_BITS,
+    THUMBNAIL_MIN_GAP_SECONDS
+)
+from services.frame_features import THUMBNAIL_DUPLICATE_BITS
+from services.face_detector import FACE_DETECTOR, FACE_DETECT_LONG_SIDE
+from services.frame_source import FrameSource, ANALYSIS_LONG_SIDE
+from services.scene_detector import SCENE_SAMPLE_FPS
+from services.audio_source import AudioSource, NoAudioStreamError
+from services.pipeline import Pipeline, Stage
+from services.result_cache import ResultCache
+from services.preview_store import PreviewStore, PREVIEW_FORMAT, PREVIEW_URL_PREFIX
+
+# Bump whenever an analyzer change alters the response, so cached results are not reused
+ANALYZER_VERSION = "11"
+
+# Stage workers shared by all requests; OpenCV, librosa and Whisper release the GIL
+# for their heavy lifting, so threads give real overlap between branches
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 8))
+_stage_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="stage")
+
+# Full responses per platform, and the platform-independent media analysis behind them
+CACHE_DIR = Path(os.getenv("CACHE_DIR", "./cache"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", 200))
+MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", 200))
+result_cache = ResultCache(CACHE_DIR / "results.sqlite3", max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+media_cache = ResultCache(CACHE_DIR / "media.sqlite3", max_bytes=MEDIA_CACHE_MAX_MB * 1024 * 1024)
+# Transcripts keyed by the decoded speech samples, so a soundtrack re-uploaded in a
+# different container or with different video still skips the model
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", 100))
+transcript_cache = ResultCache(
+    CACHE_DIR / "transcripts.sqlite3", max_bytes=TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024
+)
+# Thumbnail preview images, referenced by URL from responses; keep this larger than
+# the result cache needs so cached responses do not point at evicted previews
+PREVIEW_STORE_MAX_MB = int(os.getenv("PREVIEW_STORE_MAX_MB", 500))
+preview_store = PreviewStore(CACHE_DIR / "previews", max_bytes=PREVIEW_STORE_MAX_MB * 1024 * 1024)
+
+# Thumbnail suggestions per platform
+NUM_THUMBNAILS = 5
+
+# Pipeline outputs that do not depend on the target platform
+MEDIA_OUTPUTS = ["video_metrics", "audio_metrics", "transcript", "frame_features"]
+
+# Receives (event, data) for partial results as the analysis progresses
+EmitFn = Callable[[str, Any], None]
+
+
+def build_pipeline(
+    video_path: str,
+    platforms: List[str],
+    num_thumbnails: int = NUM_THUMBNAILS,
+    emit: Optional[EmitFn] = None
+) -> Pipeline:
+    """Wire the analyzers into a stage graph for one uploaded video and its target platforms"""
+    emit = emit or _ignore
+    # One decode pass feeds both the video metrics and the thumbnail candidates
+    frame_source = FrameSource(video_path)
+    # The container header is read on open, so clients can size the player and
+    # timeline before any stage has finished
+    emit("metadata", {
+        "duration": round(frame_source.duration, 3),
+        "width": frame_source.width,
+        "height": frame_source.height,
+        "fps": round(frame_source.fps, 3),
+        "frame_count": frame_source.frame_count
+    })
+    video_analyzer = VideoAnalyzer(video_path, frame_source=frame_source)
+    try:
+        thumbnail_suggester = ThumbnailSuggester(
+            video_path, platforms[0], frame_source=frame_source, preview_store=preview_store
+        )
+    except Exception as e:
+        print(f"⚠️  Thumbnail suggester setup failed: {str(e)}")
+        thumbnail_suggester = None
+    # Likewise one audio decode feeds loudness/silence analysis and transcription
+    audio_source = AudioSource(video_path)
+    audio_analyzer = AudioAnalyzer(video_path, audio_source=audio_source)
+    content_analyzer = ContentAnalyzer(
+        video_path, audio_source=audio_source, transcript_cache=transcript_cache
+    )
+    llm_service = LLMService()
+
+    def decode():
+        print("\n🎞️  Decoding frames...")
+        frame_source.run()
+        return frame_source
+
+    def analyze_video(frames):
+        print("\n🎥 Analyzing video...")
+        video_metrics = video_analyzer.analyze()
+        print(f"✅ Video metrics: {video_metrics}")
+        return video_metrics
+
+    def decode_audio():
+        print("\n🎧 Decoding audio...")
+        try:
+            audio_source.prepare()
+        except NoAudioStreamError:
+            print("🔇 No audio stream")
+        except Exception as e:
+            # Analyzers report the failure in their own result dicts
+            print(f"⚠️  Audio decode failed: {str(e)}")
+        return audio_source
+
+    def analyze_audio(audio):
+        print("\n🔊 Analyzing audio...")
+        audio_metrics = audio_analyzer.analyze()
+        print(f"✅ Audio metrics: {audio_metrics}")
+        return audio_metrics
+
+    def transcribe(audio, audio_metrics):
+        print("\n📝 Transcribing content...")
+        # Gate Whisper on the sound classified as speech, so music-only and silent clips
+        # skip it; if audio analysis failed, transcribe it all
+        speech_regions = None
+        if "error" not in audio_metrics:
+            speech_regions = audio_metrics["speech_regions"] if audio_metrics.get("has_audio") else []
+        transcript = content_analyzer.transcribe(speech_regions=speech_regions)
+        print(f"✅ Transcript: {transcript.get('text', 'No speech')[:100]}...")
+        return transcript
+
+    def extract_frame_features(frames=None):
+        print("\n🖼️  Scoring thumbnail candidates...")
+        try:
+            if thumbnail_suggester is None:
+                raise RuntimeError("thumbnail suggester unavailable")
+            return thumbnail_suggester.extract_frame_features()
+        except Exception as e:
+            print(f"⚠️  Thumbnail feature extraction failed: {str(e)}")
+            return None
+
+    def make_llm_stage(platform):
+        def suggest(video_metrics, audio_metrics, transcript):
+            print(f"\n🤖 Generating AI suggestions for {platform}...")
+            suggestions = llm_service.generate_suggestions(
+                video_metrics=video_metrics,
+                audio_metrics=audio_metrics,
+                transcript=transcript,
+                platform=platform,
+                on_result=lambda name, value: emit(name, {"platform": platform, "data": value})
+            )
+            print(f"✅ Suggestions generated: {suggestions.get('overall_score', 'N/A')}")
+            return suggestions
+
+        return Stage(
+            f"llm:{platform}", suggest,
+            inputs=["video_metrics", "audio_metrics", "transcript"],
+            outputs=[f"suggestions:{platform}"]
+        )
+
+    def make_thumbnail_stage(platform):
+        def suggest_thumbnails(frame_features):
+            try:
+                if thumbnail_suggester is None or frame_features is None:
+                    raise RuntimeError("thumbnail features unavailable")
+                return thumbnail_suggester.rank_frames(frame_features, platform, num_thumbnails)
+            except Exception as e:
+                print(f"⚠️  Thumbnail generation failed: {str(e)}")
+                return []
+
+        return Stage(
+            f"thumbnails:{platform}", suggest_thumbnails,
+            inputs=["frame_features"],
+            outputs=[f"thumbnail_suggestions:{platform}"]
+        )
+
+    stages = [
+        Stage("decode", decode, outputs=["frames"]),
+        Stage("video", analyze_video, inputs=["frames"], outputs=["video_metrics"]),
+        Stage("audio_decode", decode_audio, outputs=["audio"]),
+        Stage("audio", analyze_audio, inputs=["audio"], outputs=["audio_metrics"]),
+        Stage("transcript", transcribe, inputs=["audio", "audio_metrics"], outputs=["transcript"]),
+        # Parallel scoring decodes its own ranges, so it need not wait for the shared pass
+        Stage(
+            "frame_features", extract_frame_features,
+            inputs=[] if thumbnail_suggester is not None and thumbnail_suggester.parallel else ["frames"],
+            outputs=["frame_features"]
+        ),
+    ]
+    for platform in platforms:
+        stages.append(make_llm_stage(platform))
+        stages.append(make_thumbnail_stage(platform))
+
+    return Pipeline(stages, executor=_stage_executor)
+
+
+def _ignore(event: str, data: Any) -> None:
+    pass
+
+
+def _emit_output(emit: EmitFn, name: str, value: Any) -> None:
+    """Translate pipeline outputs into client-facing partial result events"""
+    if name in ("video_metrics", "audio_metrics"):
+        emit(name, value)
+    elif name == "transcript":
+        for segment in value.get("segments", []):
+            emit("transcript_segment", segment)
+        emit("transcript", {"text": value.get("text", ""), "language": value.get("language", "unknown")})
+    elif name.startswith("thumbnail_suggestions:"):
+        platform = name.split(":", 1)[1]
+        for candidate in value:
+            emit("thumbnail", {"platform": platform, "data": candidate})
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key_parts(platform: str) -> Dict[str, Any]:
+    """Settings besides the video itself that determine the analysis response"""
+    return {
+        "platform": platform,
+        "whisper_model": transcription_backend.model_id,
+        "transcribe_vad": [TRANSCRIBE_VAD, VAD_PADDING_MS, VAD_MERGE_GAP_MS],
+        "silence_detection": [SILENCE_THRESH_DB, MIN_SILENCE_MS],
+        "thumbnail_sampling": THUMBNAIL_SAMPLING,
+        "thumbnail_refine": [THUMBNAIL_COARSE_INTERVAL, THUMBNAIL_REFINE_SEEDS],
+        "thumbnail_diversity": [THUMBNAIL_DUPLICATE_BITS, THUMBNAIL_MIN_DISTANCE_BITS, THUMBNAIL_MIN_GAP_SECONDS],
+        "preview_format": PREVIEW_FORMAT,
+        "analysis_long_side": ANALYSIS_LONG_SIDE,
+        "scene_sample_fps": SCENE_SAMPLE_FPS,
+        "face_detector": [FACE_DETECTOR, FACE_DETECT_LONG_SIDE],
+        "ollama_model": os.getenv("OLLAMA_MODEL", "llama3.1:8b"),
+        "analyzer_version": ANALYZER_VERSION
+    }
+
+
+def media_key_parts() -> Dict[str, Any]:
+    """Settings that determine the platform-independent media analysis"""
+    return {
+        "whisper_model": transcription_backend.model_id,
+        "transcribe_vad": [TRANSCRIBE_VAD, VAD_PADDING_MS, VAD_MERGE_GAP_MS],
+        "silence_detection": [SILENCE_THRESH_DB, MIN_SILENCE_MS],
+        "thumbnail_sampling": THUMBNAIL_SAMPLING,
+        "thumbnail_refine": [THUMBNAIL_COARSE_INTERVAL, THUMBNAIL_REFINE_SEEDS],
+        "thumbnail_duplicate_bits": THUMBNAIL_DUPLICATE_BITS,
+        "analysis_long_side": ANALYSIS_LONG_SIDE,
+        "scene_sample_fps": SCENE_SAMPLE_FPS,
+        "face_detector": [FACE_DETECTOR, FACE_DETECT_LONG_SIDE],
+        "analyzer_version": ANALYZER_VERSION
+    }
+
+
+def _cacheable_media(outputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Media outputs to cache, or None if a stage failed transiently"""
+    if outputs["frame_features"] is None or "error" in outputs["transcript"]:
+        return None
+    return {name: outputs[name] for name in MEDIA_OUTPUTS}
+
+
+def _previews_missing(response: Dict[str, Any]) -> bool:
+    """Whether a cached response links to previews the store has since evicted
+
+    Looking a preview up also marks it recently used, so previews of responses that
+    keep being served stay in the store.
+    """
+    missing = False
+    for suggestion in response.get("thumbnail_suggestions") or []:
+        for url in (suggestion.get("preview_images") or {}).values():
+            if url and url.startswith(f"{PREVIEW_URL_PREFIX}/"):
+                if preview_store.path(url[len(PREVIEW_URL_PREFIX) + 1:]) is None:
+                    missing = True
+    return missing
+
+
+def _refresh_previews(
+    video_path: str,
+    platform: str,
+    response: Dict[str, Any],
+    content_hash: str
+) -> Optional[Dict[str, Any]]:
+    """Re-rank a cached response's thumbnails from cached features, re-encoding previews
+
+    Returns None if the features are no longer cached either, so the caller treats the
+    response as a miss.
+    """
+    media = media_cache.get(ResultCache.make_key(content_hash, **media_key_parts()))
+    if media is None:
+        return None
+
+    print(f"🖼️  Regenerating evicted thumbnail previews for {platform}")
+    suggester = ThumbnailSuggester(video_path, platform, preview_store=preview_store)
+    response["thumbnail_suggestions"] = suggester.rank_frames(media["frame_features"], platform, NUM_THUMBNAILS)
+    return response
+
+
+def run_multi_analysis(
+    video_path: str,
+    platforms: List[str],
+    content_hash: Optional[str] = None,
+    emit: Optional[EmitFn] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Analyze a video once for several platforms, returning a response per platform
+
+    emit, if given, is called with partial results (metrics, transcript, thumbnail
+    candidates, LLM sub-results) as soon as each becomes available.
+    """
+    emit = emit or _ignore
+    content_hash = content_hash or hash_file(video_path)
+
+    results = {}
+    result_keys = {}
+    for platform in platforms:
+        result_keys[platform] = ResultCache.make_key(content_hash, **cache_key_parts(platform))
+        cached = result_cache.get(result_keys[platform])
+        if cached is not None and _previews_missing(cached):
+            cached = _refresh_previews(video_path, platform, cached, content_hash)
+            if cached is not None:
+                result_cache.put(result_keys[platform], cached)
+        if cached is not None:
+            print(f"⚡ Using cached analysis for {platform}")
+            results[platform] = cached
+            emit("result", {"platform": platform, "data": cached})
+
+    missing = [platform for platform in platforms if platform not in results]
+    if not missing:
+        return results
+
+    # Reuse metrics, transcript and frame features from an earlier run for another platform
+    media_key = ResultCache.make_key(content_hash, **media_key_parts())
+    media = media_cache.get(media_key)
+    if media is not None:
+        print("⚡ Reusing cached media analysis")
+        for name in MEDIA_OUTPUTS:
+            _emit_output(emit, name, media[name])
+
+    pipeline = build_pipeline(video_path, missing, emit=emit)
+    outputs = pipeline.run(
+        on_output=lambda name, value: _emit_output(emit, name, value),
+        **(media or {})
+    )
+
+    if media is None:
+        media = _cacheable_media(outputs)
+        if media is not None:
+            media_cache.put(media_key, media)
+
+    for platform in missing:
+        suggestions = outputs[f"suggestions:{platform}"]
+        suggestions['thumbnail_suggestions'] = outputs[f"thumbnail_suggestions:{platform}"]
+
+        # Don't pin a transient failure: LLM fallback responses carry platform "unknown",
+        # and media is None when the transcript or frame scan failed
+        if media is not None and suggestions.get("platform") != "unknown":
+            result_cache.put(result_keys[platform], suggestions)
+        results[platform] = suggestions
+        emit("result", {"platform": platform, "data": suggestions})
+
+    timings = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in pipeline.timings.items())
+    print(f"⏱️  Stage timings: {timings}")
+    return results
+
+
+def run_analysis(
+    video_path: str,
+    platform: str,
+    content_hash: Optional[str] = None,
+    emit: Optional[EmitFn] = None
+) -> Dict[str, Any]:
+    """Run the full analyzer chain and return the API response body"""
+    return run_multi_analysis(video_path, [platform], content_hash, emit)[platform]
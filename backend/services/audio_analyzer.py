@@ -1,57 +1,105 @@
-import librosa
-import numpy as np
-from pydub import AudioSegment
-from pydub.silence import detect_silence
-import tempfile
 import os
+import numpy as np
+from typing import List, Optional, Tuple
+
+from services.audio_source import AudioSource, NoAudioStreamError
+from services.audio_features import AudioFeatures
+
+# Frames quieter than this (dBFS) count as silence; gaps shorter than the minimum are ignored
+SILENCE_THRESH_DB = float(os.getenv("SILENCE_THRESH_DB", -40))
+MIN_SILENCE_MS = int(os.getenv("MIN_SILENCE_MS", 500))
+
+# Sound regions are classified as speech or not in windows of about this length;
+# shorter regions are too short to judge and count as speech
+SPEECH_WINDOW_SECONDS = 3.0
+SPEECH_MIN_WINDOW_SECONDS = 1.0
+# Windows with less of their energy in the voice band than this are not speech
+SPEECH_MIN_VOICE_BAND = 0.4
+# Speech is mostly voiced; flatter windows are noise (wind, hiss, applause)
+SPEECH_MAX_FLATNESS = 0.3
+# Speech stops between syllables and words: at least this share of a window's frames
+# sit 12 dB or more below its loud frames, even over a music bed. Sustained or
+# reverberant music rarely drops that far
+SPEECH_MIN_PAUSES = 0.08
+SPEECH_PAUSE_RATIO = 0.25
+# Syllables move speech loudness at 2-8 Hz, so that band holds much of its envelope's
+# modulation; music's is spread wider or concentrated on the beat
+SYLLABLE_RATE_HZ = (2.0, 8.0)
+SPEECH_MIN_SYLLABIC = 0.4
+# Onsets that repeat at one beat period (60-240 bpm) this strongly mean music
+BEAT_PERIOD_SECONDS = (0.25, 1.0)
+MUSIC_MIN_BEAT = 0.5
 
 class AudioAnalyzer:
-    def __init__(self, video_path: str):
+    def __init__(
+        self,
+        video_path: str,
+        audio_source: Optional[AudioSource] = None,
+        silence_thresh_db: float = SILENCE_THRESH_DB,
+        min_silence_ms: int = MIN_SILENCE_MS
+    ):
         self.video_path = video_path
+        self.audio_source = audio_source or AudioSource(video_path)
+        self.silence_thresh_db = silence_thresh_db
+        self.min_silence_ms = min_silence_ms
         
     def analyze(self) -> dict:
         """Analyze audio quality metrics"""
         try:
-            # Extract audio
-            audio_path = self._extract_audio()
-            
-            # Load with librosa
-            y, sr = librosa.load(audio_path, sr=None)
+            # One STFT feeds loudness, silence, noise, onset and tempo. It runs block by
+            # block: over the shared PCM buffer for short tracks, straight from the
+            # decoder for long ones, so the working set stays one block wide
+            if not self.audio_source.streaming:
+                # Native-rate mono PCM, decoded once and shared with transcription
+                self.audio_source.samples()
+            sr = self.audio_source.native_rate
+            features = AudioFeatures.from_blocks(self.audio_source.blocks(), sr)
             
-            loudness_data = self._analyze_loudness(y)
+            duration = features.duration
+            loudness_data = self._analyze_loudness(features.rms)
+            silence_gaps, sound_regions = self._detect_silence_gaps(
+                features.rms, features.frame_seconds, duration
+            )
+            # Music, noise and effects are sound too, but only speech is worth transcribing
+            speech_regions = self._detect_speech(features, sound_regions)
+            speech_seconds = sum(r["end"] - r["start"] for r in speech_regions)
             
             metrics = {
-                "duration": len(y) / sr,
+                "duration": duration,
                 "sample_rate": sr,
                 "loudness": loudness_data,
-                "silence_gaps": self._detect_silence_gaps(audio_path),
-                "noise_level": self._estimate_noise(y),
-                "has_audio": len(y) > 0,
+                "silence_gaps": silence_gaps,
+                "sound_regions": sound_regions,
+                "speech_regions": speech_regions,
+                "speech_ratio": speech_seconds / duration if duration > 0 else 0.0,
+                "noise_level": self._estimate_noise(features.flatness),
+                "tempo": {"bpm": round(features.tempo, 1)},
+                "timeline": features.timeline(),
+                "has_audio": features.num_samples > 0,
                 "is_silent_or_low": self._is_silent_or_low_audio(loudness_data)
             }
             
-            # Cleanup
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-            
             return metrics
         
+        except NoAudioStreamError:
+            # Nothing to measure, but nothing failed either: the clip is silent
+            return {
+                "has_audio": False,
+                "silence_gaps": [],
+                "sound_regions": [],
+                "speech_regions": [],
+                "speech_ratio": 0.0,
+                "is_silent_or_low": True
+            }
+        
         except Exception as e:
             return {
                 "error": str(e),
                 "has_audio": False
             }
     
-    def _extract_audio(self) -> str:
-        """Extract audio from video"""
-        audio = AudioSegment.from_file(self.video_path)
-        temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        audio.export(temp_audio.name, format="wav")
-        return temp_audio.name
-    
-    def _analyze_loudness(self, y: np.ndarray) -> dict:
+    def _analyze_loudness(self, rms: np.ndarray) -> dict:
         """Analyze loudness (RMS)"""
-        rms = librosa.feature.rms(y=y)[0]
         avg_rms = np.mean(rms)
         
         # Convert to dB
@@ -63,20 +111,104 @@ class AudioAnalyzer:
             "is_too_loud": db > -10
         }
     
-    def _detect_silence_gaps(self, audio_path: str) -> list:
-        """Detect silence gaps"""
-        audio = AudioSegment.from_file(audio_path)
-        silences = detect_silence(audio, min_silence_len=500, silence_thresh=-40)
-        
-        return [
-            {"start": s[0] / 1000, "end": s[1] / 1000}
-            for s in silences[:5]  # Return first 5
+    def _detect_silence_gaps(
+        self,
+        rms: np.ndarray,
+        frame_seconds: float,
+        duration: float
+    ) -> Tuple[List[dict], List[dict]]:
+        """Detect silence gaps and the sound regions between them from RMS frames"""
+        if len(rms) == 0:
+            return [], []
+        
+        db = 20 * np.log10(np.maximum(rms, 1e-10))
+        silent = db < self.silence_thresh_db
+        
+        # Run-length encode the silent mask: +1 marks a run start, -1 the end
+        edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        
+        min_frames = self.min_silence_ms / 1000 / frame_seconds
+        keep = (ends - starts) >= min_frames
+        gap_starts = starts[keep] * frame_seconds
+        gap_ends = np.minimum(ends[keep] * frame_seconds, duration)
+        
+        silence_gaps = [
+            {"start": round(float(s), 3), "end": round(float(e), 3)}
+            for s, e in zip(gap_starts, gap_ends)
         ]
+        
+        # Everything outside the kept gaps is treated as sound
+        bounds = np.concatenate(([0.0], np.column_stack((gap_starts, gap_ends)).ravel(), [duration]))
+        sound_regions = [
+            {"start": round(float(s), 3), "end": round(float(e), 3)}
+            for s, e in bounds.reshape(-1, 2)
+            if e - s > 0
+        ]
+        
+        return silence_gaps, sound_regions
+    
+    def _detect_speech(self, features: AudioFeatures, sound_regions: List[dict]) -> List[dict]:
+        """The parts of the sound regions that sound like speech, judged window by window"""
+        speech_regions: List[dict] = []
+        for region in sound_regions:
+            length = region["end"] - region["start"]
+            num_windows = max(1, int(round(length / SPEECH_WINDOW_SECONDS)))
+            edges = np.linspace(region["start"], region["end"], num_windows + 1)
+            for start, end in zip(edges[:-1], edges[1:]):
+                if not self._is_speech(features, start, end):
+                    continue
+                # Adjacent speech windows make one region
+                if speech_regions and speech_regions[-1]["end"] == round(float(start), 3):
+                    speech_regions[-1]["end"] = round(float(end), 3)
+                else:
+                    speech_regions.append({"start": round(float(start), 3), "end": round(float(end), 3)})
+        return speech_regions
+    
+    def _is_speech(self, features: AudioFeatures, start: float, end: float) -> bool:
+        """Classify one window from its voice-band energy, flatness, pauses, syllable rate and beat"""
+        frame_seconds = features.frame_seconds
+        first, last = int(start / frame_seconds), int(np.ceil(end / frame_seconds))
+        if end - start < SPEECH_MIN_WINDOW_SECONDS or last - first < 2:
+            return True
+        
+        energy = features.rms[first:last] ** 2
+        voice_band = features.voice_band[first:last]
+        if np.sum(energy * voice_band) < SPEECH_MIN_VOICE_BAND * np.sum(energy):
+            return False
+        if np.median(features.flatness[first:last]) > SPEECH_MAX_FLATNESS:
+            return False
+        
+        # Voice-band loudness
+        envelope = np.sqrt(energy * voice_band)
+        pauses = np.mean(envelope < SPEECH_PAUSE_RATIO * np.percentile(envelope, 90))
+        if pauses < SPEECH_MIN_PAUSES:
+            return False
+        
+        modulation = np.abs(np.fft.rfft(envelope - np.mean(envelope))) ** 2
+        rates = np.fft.rfftfreq(len(envelope), frame_seconds)
+        in_syllable_band = (rates >= SYLLABLE_RATE_HZ[0]) & (rates <= SYLLABLE_RATE_HZ[1])
+        syllabic = np.sum(modulation[in_syllable_band]) / max(np.sum(modulation[1:]), 1e-20)
+        if syllabic >= SPEECH_MIN_SYLLABIC:
+            return True
+        
+        # Autocorrelation of the onset envelope at beat periods
+        onsets = features.onset_envelope[first:last]
+        onsets = onsets - np.mean(onsets)
+        autocorrelation = np.correlate(onsets, onsets, mode="full")[len(onsets) - 1:]
+        if autocorrelation[0] <= 0:
+            return True
+        lags = slice(
+            int(BEAT_PERIOD_SECONDS[0] / frame_seconds),
+            int(BEAT_PERIOD_SECONDS[1] / frame_seconds) + 1
+        )
+        beat = np.max(autocorrelation[lags], initial=0.0) / autocorrelation[0]
+        return beat < MUSIC_MIN_BEAT
     
-    def _estimate_noise(self, y: np.ndarray) -> dict:
+    def _estimate_noise(self, spectral_flatness: np.ndarray) -> dict:
         """Estimate background noise"""
         # Simple noise estimation using spectral flatness
-        spectral_flatness = librosa.feature.spectral_flatness(y=y)[0]
         avg_flatness = np.mean(spectral_flatness)
         
         return {
@@ -0,0 +1,194 @@
+import librosa
+import numpy as np
+from typing import Any, Dict, Iterable, List
+
+# librosa.feature.rms / spectral_flatness defaults
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Telephone band, where most of the energy of speech lies
+VOICE_BAND_HZ = (300.0, 3400.0)
+
+# Seconds per point in the returned timeline
+TIMELINE_RESOLUTION = 0.5
+
+# librosa.feature.tempo defaults; the tempogram is averaged chunk by chunk so its
+# size stays fixed instead of growing with the onset envelope
+TEMPO_WIN_LENGTH = 384
+TEMPO_CHUNK_FRAMES = 8192
+TEMPO_START_BPM = 120.0
+TEMPO_MAX_BPM = 320.0
+
+
+def estimate_tempo(onset_envelope: np.ndarray, sr: int, hop_length: int) -> float:
+    """Global tempo like librosa.feature.tempo(aggregate=np.mean), in bounded memory"""
+    if not len(onset_envelope) or not np.any(onset_envelope > 0):
+        return 0.0
+
+    total = np.zeros(TEMPO_WIN_LENGTH)
+    count = 0
+    for start in range(0, len(onset_envelope), TEMPO_CHUNK_FRAMES):
+        tempogram = librosa.feature.tempogram(
+            onset_envelope=onset_envelope[start:start + TEMPO_CHUNK_FRAMES],
+            sr=sr, hop_length=hop_length, win_length=TEMPO_WIN_LENGTH
+        )
+        total += tempogram.sum(axis=1)
+        count += tempogram.shape[1]
+
+    bpms = librosa.tempo_frequencies(TEMPO_WIN_LENGTH, hop_length=hop_length, sr=sr)
+    # Log-normal prior centred on the start tempo, as librosa does
+    with np.errstate(divide="ignore"):
+        logprior = -0.5 * (np.log2(bpms) - np.log2(TEMPO_START_BPM)) ** 2
+    logprior[bpms > TEMPO_MAX_BPM] = -np.inf
+    best = np.argmax(np.log1p(1e6 * total / count) + logprior)
+    return float(bpms[best])
+
+
+class SpectralAccumulator:
+    """Frames arbitrary-sized sample blocks into STFT frames and keeps per-frame features
+
+    Framing matches librosa's centered STFT (n_fft // 2 zeros of padding at both ends),
+    so feeding a signal in one block or many gives the same frames. Only one window of
+    samples is carried between blocks; the per-frame outputs are a few floats per hop.
+    """
+
+    def __init__(self, sr: int, n_fft: int = N_FFT, hop_length: int = HOP_LENGTH):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.num_samples = 0
+
+        self._window = librosa.filters.get_window("hann", n_fft, fftbins=True).astype(np.float32)
+        # RMS from a windowed spectrum is scaled by the window's energy; undo that so
+        # levels (and the dB thresholds built on them) match time-domain RMS
+        self._window_gain = np.sqrt(np.mean(self._window.astype(np.float64) ** 2))
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        frequencies = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        self._voice_bins = (frequencies >= VOICE_BAND_HZ[0]) & (frequencies <= VOICE_BAND_HZ[1])
+
+        self._pending = np.zeros(n_fft // 2, dtype=np.float32)
+        self._prev_log_mel = None
+        self._rms: List[np.ndarray] = []
+        self._flatness: List[np.ndarray] = []
+        self._onset: List[np.ndarray] = []
+        self._voice_band: List[np.ndarray] = []
+
+    def update(self, block: np.ndarray) -> None:
+        self.num_samples += len(block)
+        self._pending = np.concatenate((self._pending, block.astype(np.float32, copy=False)))
+        self._consume()
+
+    def finish(self) -> None:
+        self._pending = np.concatenate((self._pending, np.zeros(self.n_fft // 2, dtype=np.float32)))
+        self._consume()
+        self._pending = self._pending[:0]
+
+    def _consume(self) -> None:
+        num_frames = 0
+        if len(self._pending) >= self.n_fft:
+            num_frames = 1 + (len(self._pending) - self.n_fft) // self.hop_length
+        if num_frames == 0:
+            return
+
+        frames = np.lib.stride_tricks.sliding_window_view(self._pending, self.n_fft)[::self.hop_length][:num_frames]
+        S = np.abs(np.fft.rfft(frames * self._window, axis=1)).T
+        self._add_spectrum(S)
+
+        # Keep the tail that later frames still overlap
+        self._pending = self._pending[num_frames * self.hop_length:]
+
+    def _add_spectrum(self, S: np.ndarray) -> None:
+        power = S.astype(np.float64) ** 2
+
+        # Same as librosa.feature.rms(S=...), window-gain corrected
+        energy = 2 * np.sum(power, axis=0) - power[0] - power[-1]
+        self._rms.append(np.sqrt(energy / self.n_fft ** 2) / self._window_gain)
+
+        # Same as librosa.feature.spectral_flatness(S=...)
+        power_thresh = np.maximum(power, 1e-10)
+        gmean = np.exp(np.mean(np.log(power_thresh), axis=0))
+        self._flatness.append(gmean / np.mean(power_thresh, axis=0))
+
+        # Spectral flux on a log-mel spectrogram, carried across block boundaries
+        log_mel = 10 * np.log10(np.maximum(self._mel_basis @ power, 1e-10))
+        prev = log_mel[:, :1] if self._prev_log_mel is None else self._prev_log_mel
+        flux = np.diff(np.concatenate((prev, log_mel), axis=1), axis=1)
+        self._onset.append(np.mean(np.maximum(0.0, flux), axis=0))
+        self._prev_log_mel = log_mel[:, -1:]
+
+        # Share of each frame's energy in the voice band
+        self._voice_band.append(
+            np.sum(power[self._voice_bins], axis=0) / np.maximum(np.sum(power, axis=0), 1e-20)
+        )
+
+    def features(self) -> "AudioFeatures":
+        def joined(parts: List[np.ndarray]) -> np.ndarray:
+            return np.concatenate(parts) if parts else np.zeros(0)
+
+        return AudioFeatures(
+            self.sr, self.hop_length, self.num_samples,
+            joined(self._rms), joined(self._flatness), joined(self._onset), joined(self._voice_band)
+        )
+
+
+class AudioFeatures:
+    """Per-frame audio features derived from a single STFT of the signal"""
+
+    def __init__(
+        self,
+        sr: int,
+        hop_length: int,
+        num_samples: int,
+        rms: np.ndarray,
+        flatness: np.ndarray,
+        onset_envelope: np.ndarray,
+        voice_band: np.ndarray
+    ):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.num_samples = num_samples
+        self.rms = rms
+        self.flatness = flatness
+        self.onset_envelope = onset_envelope
+        self.voice_band = voice_band
+
+        self.tempo = estimate_tempo(onset_envelope, sr, hop_length)
+
+    @classmethod
+    def from_signal(cls, y: np.ndarray, sr: int) -> "AudioFeatures":
+        return cls.from_blocks([y], sr)
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[np.ndarray], sr: int) -> "AudioFeatures":
+        """Build features from a stream of sample blocks without holding the whole signal"""
+        accumulator = SpectralAccumulator(sr)
+        for block in blocks:
+            accumulator.update(block)
+        accumulator.finish()
+        return accumulator.features()
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / self.sr
+
+    @property
+    def frame_seconds(self) -> float:
+        return self.hop_length / self.sr
+
+    def timeline(self, resolution: float = TIMELINE_RESOLUTION) -> Dict[str, Any]:
+        """Average the per-frame features into fixed windows for compact output"""
+        frames_per_point = max(1, int(round(resolution / self.frame_seconds)))
+        num_points = int(np.ceil(len(self.rms) / frames_per_point))
+
+        def pooled(values: np.ndarray) -> np.ndarray:
+            padded = np.full(num_points * frames_per_point, np.nan)
+            padded[:len(values)] = values
+            return np.nanmean(padded.reshape(num_points, frames_per_point), axis=1)
+
+        rms_db = 20 * np.log10(np.maximum(pooled(self.rms), 1e-10))
+        return {
+            "resolution": frames_per_point * self.frame_seconds,
+            "loudness_db": np.round(rms_db, 1).tolist(),
+            "flatness": np.round(pooled(self.flatness), 3).tolist(),
+            "onset_strength": np.round(pooled(self.onset_envelope), 3).tolist()
+        }
@@ -0,0 +1,145 @@
+import os
+import ffmpeg
+import librosa
+import threading
+import numpy as np
+from typing import Dict, Iterator, Optional, Tuple
+
+# Whisper expects 16 kHz mono float32
+WHISPER_SAMPLE_RATE = 16000
+
+# "auto" streams audio analysis for tracks at least AUDIO_STREAMING_MIN_SECONDS long,
+# "always"/"never" force the choice
+AUDIO_STREAMING = os.getenv("AUDIO_STREAMING", "auto").lower()
+AUDIO_STREAMING_MIN_SECONDS = float(os.getenv("AUDIO_STREAMING_MIN_SECONDS", 300))
+AUDIO_BLOCK_SECONDS = float(os.getenv("AUDIO_BLOCK_SECONDS", 10))
+
+
+class NoAudioStreamError(ValueError):
+    """The file has no audio to analyze; a silent clip rather than a failure"""
+
+
+class AudioSource:
+    """Decodes a video's audio track once into mono float32 PCM shared by every audio consumer
+
+    In streaming mode the native-rate track is never held in memory: analysis reads it
+    in fixed-size blocks from a decoder pipe, and consumers asking for a specific rate
+    (Whisper at 16 kHz) get a direct decode at that rate.
+    """
+
+    def __init__(self, video_path: str, streaming: Optional[str] = None):
+        self.video_path = video_path
+        self.streaming_mode = (streaming or AUDIO_STREAMING).lower()
+        self._buffers: Dict[int, np.ndarray] = {}
+        self._native_rate: Optional[int] = None
+        self._duration = 0.0
+        self._error: Optional[Exception] = None
+        self._lock = threading.Lock()
+
+    @property
+    def native_rate(self) -> int:
+        with self._lock:
+            self._probe()
+        return self._native_rate
+
+    @property
+    def streaming(self) -> bool:
+        with self._lock:
+            self._probe()
+        if self.streaming_mode == "always":
+            return True
+        if self.streaming_mode == "never":
+            return False
+        return self._duration >= AUDIO_STREAMING_MIN_SECONDS
+
+    def prepare(self) -> None:
+        """Do the shared decode up front (only probes in streaming mode)"""
+        if not self.streaming:
+            self.samples()
+
+    def samples(self, sr: Optional[int] = None) -> Tuple[np.ndarray, int]:
+        """Return (samples, sample_rate), at the native rate unless sr is given"""
+        streaming = self.streaming
+        with self._lock:
+            rate = sr or self._native_rate
+            if rate in self._buffers:
+                return self._buffers[rate], rate
+
+            if streaming:
+                self._buffers[rate] = self._decode(rate)
+            else:
+                if self._native_rate not in self._buffers:
+                    self._buffers[self._native_rate] = self._decode(self._native_rate)
+                if rate not in self._buffers:
+                    native = self._buffers[self._native_rate]
+                    self._buffers[rate] = librosa.resample(
+                        native, orig_sr=self._native_rate, target_sr=rate
+                    ).astype(np.float32)
+            return self._buffers[rate], rate
+
+    def blocks(self, block_seconds: float = AUDIO_BLOCK_SECONDS) -> Iterator[np.ndarray]:
+        """Yield native-rate samples in fixed-size blocks, decoding through a pipe"""
+        rate = self.native_rate
+        with self._lock:
+            native = self._buffers.get(rate)
+        if native is not None:
+            step = int(rate * block_seconds)
+            for start in range(0, len(native), step):
+                yield native[start:start + step]
+            return
+
+        block_bytes = int(rate * block_seconds) * 4
+        process = (
+            ffmpeg
+            .input(self.video_path)
+            .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=rate)
+            .global_args("-loglevel", "error")
+            .run_async(pipe_stdout=True)
+        )
+        try:
+            while True:
+                chunk = process.stdout.read(block_bytes)
+                if not chunk:
+                    break
+                # A read can end mid-sample only at EOF; drop the partial float
+                usable = len(chunk) - len(chunk) % 4
+                yield np.frombuffer(chunk[:usable], dtype=np.float32)
+        finally:
+            process.stdout.close()
+            process.wait()
+        if process.returncode not in (0, None):
+            raise RuntimeError(f"Audio decode failed with exit code {process.returncode}")
+
+    def _probe(self) -> None:
+        # A failed probe (e.g. no audio stream) is remembered so every consumer sees it
+        if self._error is not None:
+            raise self._error
+        if self._native_rate is not None:
+            return
+        try:
+            probe = ffmpeg.probe(self.video_path)
+        except ffmpeg.Error as e:
+            self._error = RuntimeError(f"Audio probe failed: {e.stderr.decode(errors='ignore')[-300:]}")
+            raise self._error
+
+        audio_streams = [s for s in probe["streams"] if s.get("codec_type") == "audio"]
+        if not audio_streams:
+            self._error = NoAudioStreamError("Video has no audio stream")
+            raise self._error
+        self._native_rate = int(audio_streams[0]["sample_rate"])
+        self._duration = float(probe.get("format", {}).get("duration", 0) or 0)
+
+    def _decode(self, rate: int) -> np.ndarray:
+        try:
+            out, _ = (
+                ffmpeg
+                .input(self.video_path)
+                .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=rate)
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+        except ffmpeg.Error as e:
+            self._error = RuntimeError(f"Audio decode failed: {e.stderr.decode(errors='ignore')[-300:]}")
+            raise self._error
+
+        # Copy so consumers (Whisper's torch.from_numpy) get a writable array
+        return np.frombuffer(out, dtype=np.float32).copy()
@@ -0,0 +1,155 @@
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.transcription_backends import TranscriptionBackend
+
+# Worker processes for chunked transcription, each with its own model; 1 keeps the
+# single in-process decode
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 1))
+# Chunk length plus overlap on both sides should fit Whisper's 30 s window
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", 28))
+TRANSCRIBE_OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", 1))
+
+# Cuts are placed at the quietest point this far before each chunk's target end
+CUT_SEARCH_SECONDS = 4.0
+CUT_FRAME_SECONDS = 0.05
+
+# Set in each worker process by _init_worker
+_worker_backend: Optional[TranscriptionBackend] = None
+_worker_model = None
+
+
+def _init_worker(backend: TranscriptionBackend, cpu_threads: int) -> None:
+    global _worker_backend, _worker_model
+    _worker_backend = backend
+    _worker_model = backend.load(cpu_threads=cpu_threads)
+
+
+def _worker_ready() -> bool:
+    return _worker_model is not None
+
+
+def _transcribe_chunk(audio: np.ndarray) -> Dict[str, Any]:
+    return _worker_backend.transcribe(_worker_model, audio, word_timestamps=True)
+
+
+def plan_chunks(audio: np.ndarray, sr: int, chunk_seconds: float) -> List[int]:
+    """Sample offsets of chunk boundaries, each cut at the quietest point near the target"""
+    n = len(audio)
+    target = int(chunk_seconds * sr)
+    if n <= target:
+        return [0, n]
+
+    hop = int(CUT_FRAME_SECONDS * sr)
+    num_frames = n // hop
+    energy = np.mean(audio[:num_frames * hop].reshape(num_frames, hop) ** 2, axis=1)
+    search = int(min(CUT_SEARCH_SECONDS, chunk_seconds / 2) * sr) // hop
+
+    cuts = [0]
+    while n - cuts[-1] > target:
+        hi = (cuts[-1] + target) // hop
+        lo = max(cuts[-1] // hop + 1, hi - search)
+        quietest = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(quietest * hop + hop // 2)
+    cuts.append(n)
+    return cuts
+
+
+def stitch(chunk_results: List[Dict[str, Any]], bounds: List[Tuple[float, float, float]]) -> Dict[str, Any]:
+    """Merge chunk transcripts into one, keeping each overlapping word only once
+
+    bounds holds (audio offset, owned start, owned end) per chunk in seconds. A word
+    belongs to the chunk whose owned span contains its midpoint, so words heard in
+    both sides of an overlap are kept from exactly one of them.
+    """
+    segments = []
+    language_seconds: Dict[str, float] = {}
+    for result, (offset, owned_start, owned_end) in zip(chunk_results, bounds):
+        language = result["language"]
+        language_seconds[language] = language_seconds.get(language, 0.0) + owned_end - owned_start
+
+        for seg in result["segments"]:
+            words = [
+                w for w in seg["words"]
+                if owned_start <= offset + (w["start"] + w["end"]) / 2 < owned_end
+            ]
+            if seg["words"]:
+                if not words:
+                    continue
+                start, end = words[0]["start"], words[-1]["end"]
+                text = "".join(w["word"] for w in words)
+            else:
+                start, end, text = seg["start"], seg["end"], seg["text"]
+                if not owned_start <= offset + (start + end) / 2 < owned_end:
+                    continue
+            segments.append({"start": offset + start, "end": offset + end, "text": text})
+
+    return {
+        "text": "".join(seg["text"] for seg in segments),
+        "segments": segments,
+        "language": max(language_seconds, key=language_seconds.get) if language_seconds else "unknown"
+    }
+
+
+class ChunkedTranscriber:
+    """Transcribes long audio as silence-aligned chunks in a pool of model worker processes"""
+
+    def __init__(
+        self,
+        backend: TranscriptionBackend,
+        workers: int = TRANSCRIBE_WORKERS,
+        chunk_seconds: float = TRANSCRIBE_CHUNK_SECONDS,
+        overlap_seconds: float = TRANSCRIBE_OVERLAP_SECONDS
+    ):
+        self.backend = backend
+        self.workers = workers
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def should_chunk(self, num_samples: int, sr: int) -> bool:
+        return self.enabled and num_samples > self.chunk_seconds * sr
+
+    def preload(self) -> None:
+        """Start every worker and load its model now rather than on the first upload"""
+        executor = self._get_executor()
+        for future in [executor.submit(_worker_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def transcribe(self, audio: np.ndarray, sr: int) -> Dict[str, Any]:
+        cuts = plan_chunks(audio, sr, self.chunk_seconds)
+        overlap = int(self.overlap_seconds * sr)
+
+        bounds = []
+        futures = []
+        executor = self._get_executor()
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            audio_start = max(0, start - overlap)
+            audio_end = min(len(audio), end + overlap)
+            bounds.append((audio_start / sr, start / sr, end / sr))
+            futures.append(executor.submit(_transcribe_chunk, audio[audio_start:audio_end]))
+
+        print(f"🧩 Transcribing {len(futures)} chunks on {self.workers} workers")
+        return stitch([future.result() for future in futures], bounds)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork: the server process already runs threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.backend, max(1, (os.cpu_count() or 1) // self.workers))
+                )
+            return self._executor
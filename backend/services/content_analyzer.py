@@ -1,31 +1,140 @@
-import whisper
-import tempfile
-from pydub import AudioSegment
+import os
+import hashlib
+import numpy as np
+from typing import List, Optional, Tuple
+
+from services.audio_source import AudioSource, WHISPER_SAMPLE_RATE
+from services.chunked_transcriber import ChunkedTranscriber
+from services.model_pool import ModelPool
+from services.result_cache import ResultCache
+from services.transcription_backends import TranscriptionBackend, get_backend
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")  # Use 'base' for speed
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", 1))
+
+# Send only detected speech regions to Whisper; padding keeps word edges, and regions
+# closer than the merge gap are joined so sentences are not cut apart
+TRANSCRIBE_VAD = os.getenv("TRANSCRIBE_VAD", "true").lower() == "true"
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", 200))
+VAD_MERGE_GAP_MS = int(os.getenv("VAD_MERGE_GAP_MS", 1000))
+# Above this share of the clip, cutting out the little silence left is not worth it
+VAD_MAX_SPEECH_RATIO = 0.9
+
+# Engine chosen by TRANSCRIBE_BACKEND, sized by WHISPER_MODEL
+transcription_backend = get_backend(WHISPER_MODEL)
+
+# Loaded once per process and shared by every request
+whisper_pool = ModelPool(
+    transcription_backend.load,
+    size=WHISPER_POOL_SIZE,
+    name=f"Whisper '{transcription_backend.model_id}'"
+)
+# Used instead of the pool for long audio when TRANSCRIBE_WORKERS > 1
+chunked_whisper = ChunkedTranscriber(transcription_backend)
+
+
+def merge_speech_regions(
+    regions: List[dict],
+    duration: float,
+    padding: float = VAD_PADDING_MS / 1000,
+    merge_gap: float = VAD_MERGE_GAP_MS / 1000
+) -> List[Tuple[float, float]]:
+    """Pad speech regions, clip them to the clip and join the ones closer than merge_gap"""
+    merged: List[Tuple[float, float]] = []
+    for region in sorted(regions, key=lambda r: r["start"]):
+        start = max(0.0, region["start"] - padding)
+        end = min(duration, region["end"] + padding)
+        if end <= start:
+            continue
+        if merged and start - merged[-1][1] <= merge_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def pcm_fingerprint(audio: np.ndarray) -> str:
+    """Hash of the decoded samples, identical for the same soundtrack in any container"""
+    return hashlib.sha256(np.ascontiguousarray(audio, dtype=np.float32).view(np.uint8)).hexdigest()
+
+
+class SpeechClip:
+    """Speech regions spliced into one buffer, with a map back to the original timeline"""
+
+    def __init__(self, audio: np.ndarray, regions: List[Tuple[float, float]], sr: int):
+        pieces = []
+        # (start in spliced audio, start in original audio, length), all in seconds
+        self.offsets: List[Tuple[float, float, float]] = []
+        position = 0.0
+        for start, end in regions:
+            piece = audio[int(start * sr):int(end * sr)]
+            pieces.append(piece)
+            self.offsets.append((position, start, len(piece) / sr))
+            position += len(piece) / sr
+        self.audio = np.concatenate(pieces) if pieces else audio[:0]
+
+    def to_original(self, t: float) -> float:
+        """Map a time in the spliced audio back onto the original clip"""
+        spliced_starts = [offset[0] for offset in self.offsets]
+        index = max(0, int(np.searchsorted(spliced_starts, t, side="right")) - 1)
+        spliced_start, original_start, length = self.offsets[index]
+        return original_start + min(max(t - spliced_start, 0.0), length)
+
 
 class ContentAnalyzer:
-    def __init__(self, video_path: str):
+    def __init__(
+        self,
+        video_path: str,
+        model_pool: Optional[ModelPool] = None,
+        audio_source: Optional[AudioSource] = None,
+        chunked_transcriber: Optional[ChunkedTranscriber] = None,
+        backend: Optional[TranscriptionBackend] = None,
+        transcript_cache: Optional[ResultCache] = None
+    ):
         self.video_path = video_path
-        self.model = None
+        # The pool's models must come from the same backend that runs them
+        self.backend = backend or transcription_backend
+        self.model_pool = model_pool or whisper_pool
+        self.chunked_transcriber = chunked_transcriber or chunked_whisper
+        self.transcript_cache = transcript_cache
+        self.audio_source = audio_source or AudioSource(video_path)
         
-    def transcribe(self) -> dict:
-        """Transcribe audio to text using Whisper"""
+    def transcribe(self, speech_regions: Optional[List[dict]] = None) -> dict:
+        """Transcribe audio to text using Whisper
+
+        With speech_regions (sound AudioAnalyzer classified as speech), only those parts
+        of the clip are transcribed and Whisper is skipped entirely when there are none. Without them
+        the whole track is transcribed.
+        """
         try:
-            # Extract audio
-            audio_path = self._extract_audio()
-            
-            # Load Whisper model (lazy loading)
-            if self.model is None:
-                self.model = whisper.load_model("base")  # Use 'base' for speed
-            
-            # Transcribe
-            result = self.model.transcribe(audio_path)
+            if TRANSCRIBE_VAD and speech_regions is not None and not speech_regions:
+                print("🔇 No speech regions, skipping transcription")
+                return self._skipped()
+
+            # 16 kHz mono PCM from the shared decode, no temporary WAV
+            audio, sr = self.audio_source.samples(sr=WHISPER_SAMPLE_RATE)
+            duration = len(audio) / sr
+
+            clip = None
+            if TRANSCRIBE_VAD and speech_regions is not None:
+                regions = merge_speech_regions(speech_regions, duration)
+                speech_seconds = sum(end - start for start, end in regions)
+                if not regions:
+                    return self._skipped()
+                if speech_seconds < VAD_MAX_SPEECH_RATIO * duration:
+                    clip = SpeechClip(audio, regions, sr)
+                    print(f"🗣️  Transcribing {speech_seconds:.1f}s of speech out of {duration:.1f}s")
             
+            speech = clip.audio if clip is not None else audio
+            result = self._transcribe_speech(speech, sr)
+
+            to_original = clip.to_original if clip is not None else float
             return {
                 "text": result["text"],
                 "segments": [
                     {
-                        "start": seg["start"],
-                        "end": seg["end"],
+                        "start": round(to_original(seg["start"]), 3),
+                        "end": round(to_original(seg["end"]), 3),
                         "text": seg["text"]
                     }
                     for seg in result["segments"]
@@ -39,10 +148,37 @@ class ContentAnalyzer:
                 "segments": [],
                 "error": str(e)
             }
-    
-    def _extract_audio(self) -> str:
-        """Extract audio from video"""
-        audio = AudioSegment.from_file(self.video_path)
-        temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        audio.export(temp_audio.name, format="wav")
-        return temp_audio.name
+
+    def _transcribe_speech(self, speech: np.ndarray, sr: int) -> dict:
+        """Run the model on the exact samples given, reusing a cached transcript of them"""
+        cache_key = None
+        if self.transcript_cache is not None:
+            cache_key = ResultCache.make_key(pcm_fingerprint(speech), model=self.backend.model_id)
+            cached = self.transcript_cache.get(cache_key)
+            if cached is not None:
+                print("⚡ Transcript cache hit")
+                return cached
+
+        if self.chunked_transcriber.should_chunk(len(speech), sr):
+            # Long audio: silence-aligned chunks decoded in parallel worker processes
+            result = self.chunked_transcriber.transcribe(speech, sr)
+        else:
+            # Borrow a preloaded Whisper model from the shared pool
+            with self.model_pool.acquire() as model:
+                result = self.backend.transcribe(model, speech)
+
+        if cache_key is not None:
+            # Timestamps stay relative to these samples; callers map them afterwards
+            self.transcript_cache.put(cache_key, {
+                "text": result["text"],
+                "segments": [
+                    {"start": seg["start"], "end": seg["end"], "text": seg["text"]}
+                    for seg in result["segments"]
+                ],
+                "language": result.get("language", "unknown")
+            })
+        return result
+
+    def _skipped(self) -> dict:
+        """Empty transcript for clips without speech; not an error, so it can be cached"""
+        return {"text": "", "segments": [], "language": "unknown", "skipped": True}
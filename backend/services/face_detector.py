@@ -0,0 +1,133 @@
+import os
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Any, List, Tuple
+
+from services.frame_source import downscale
+from services.model_pool import ModelPool
+
+# "haar" (OpenCV's bundled frontal face cascade) or "dnn" (YuNet via cv2.FaceDetectorYN,
+# faster and far more accurate on CPU, from a local ONNX file)
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "haar").lower()
+FACE_MODEL_PATH = os.getenv("FACE_MODEL_PATH", "./models/face_detection_yunet_2023mar.onnx")
+# Faces are searched for on a copy with this long side; boxes are scaled back up.
+# Faces smaller than about 5% of the frame width are missed, and they barely count
+# towards prominence anyway
+FACE_DETECT_LONG_SIDE = int(os.getenv("FACE_DETECT_LONG_SIDE", 480))
+# Detector instances per process; each is used by one thread at a time
+FACE_DETECTOR_POOL_SIZE = int(os.getenv("FACE_DETECTOR_POOL_SIZE", 2))
+
+# Haar: the cascade's own window is 24px
+HAAR_MIN_FACE = 24
+# YuNet: minimum confidence for a face
+DNN_SCORE_THRESHOLD = 0.7
+
+# (x, y, width, height) in the coordinates of the image passed in
+Box = Tuple[int, int, int, int]
+
+
+class FaceModelLoadError(RuntimeError):
+    """The detector model could not be loaded, so no frame can be analyzed"""
+
+
+class FaceDetector:
+    """Process-wide face detection, with the model loaded once and lent out per thread
+
+    Neither OpenCV detector is safe to share between threads, so instances come from
+    a ModelPool. If the model cannot be loaded, face detection is disabled with a
+    warning rather than failing the thumbnail stage; an error on a single frame only
+    skips that frame.
+    """
+
+    def __init__(
+        self,
+        kind: str = FACE_DETECTOR,
+        model_path: str = FACE_MODEL_PATH,
+        long_side: int = FACE_DETECT_LONG_SIDE,
+        pool_size: int = FACE_DETECTOR_POOL_SIZE
+    ):
+        if kind not in ("haar", "dnn"):
+            raise ValueError(f"Unknown FACE_DETECTOR '{kind}', expected 'haar' or 'dnn'")
+        self.kind = kind
+        self.model_path = model_path
+        self.long_side = long_side
+        self.pool = ModelPool(self._load, size=pool_size, name=f"{kind} face detector")
+        self.available = True
+
+    def preload(self) -> None:
+        try:
+            self.pool.preload()
+        except Exception as e:
+            self._disable(e)
+
+    def detect(self, image: np.ndarray) -> List[Box]:
+        """Face boxes in a BGR image, found on a downscaled copy"""
+        small = downscale(image, self.long_side)
+        scale = max(image.shape[:2]) / max(small.shape[:2])
+        with self.pool.acquire() as model:
+            if self.kind == "dnn":
+                boxes = self._detect_dnn(model, small)
+            else:
+                boxes = self._detect_haar(model, small)
+        return [tuple(int(round(value * scale)) for value in box) for box in boxes]
+
+    def analyze(self, image: np.ndarray) -> Tuple[bool, int, float]:
+        """Return (has_faces, face_count, prominence_score) for a BGR image"""
+        if not self.available:
+            return (False, 0, 0.0)
+        try:
+            faces = self.detect(image)
+        except FaceModelLoadError as e:
+            self._disable(e)
+            return (False, 0, 0.0)
+        except Exception as e:
+            # A bad frame says nothing about the model; skip just this one
+            print(f"⚠️  Face detection failed on a frame: {str(e)}")
+            return (False, 0, 0.0)
+
+        # Prominence: share of the frame covered by faces
+        frame_area = image.shape[0] * image.shape[1]
+        prominence = sum(w * h for (_, _, w, h) in faces) / frame_area * 100
+        return (len(faces) > 0, len(faces), float(min(100, prominence)))
+
+    def _load(self) -> Any:
+        try:
+            return self._create()
+        except Exception as e:
+            raise FaceModelLoadError(str(e)) from e
+
+    def _create(self) -> Any:
+        if self.kind == "dnn":
+            if not Path(self.model_path).is_file():
+                raise RuntimeError(f"FACE_DETECTOR=dnn needs a YuNet ONNX model at {self.model_path}")
+            return cv2.FaceDetectorYN.create(self.model_path, "", (320, 320), DNN_SCORE_THRESHOLD)
+
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        if cascade.empty():
+            raise RuntimeError("Haar face cascade could not be loaded")
+        return cascade
+
+    def _detect_haar(self, cascade: Any, image: np.ndarray) -> List[Box]:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = cascade.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(HAAR_MIN_FACE, HAAR_MIN_FACE)
+        )
+        return [tuple(face) for face in faces]
+
+    def _detect_dnn(self, detector: Any, image: np.ndarray) -> List[Box]:
+        height, width = image.shape[:2]
+        detector.setInputSize((width, height))
+        _, faces = detector.detect(image)
+        if faces is None:
+            return []
+        return [tuple(face[:4]) for face in faces]
+
+    def _disable(self, error: Exception) -> None:
+        if self.available:
+            print(f"⚠️  Face detector unavailable ({error}), face detection will be disabled")
+        self.available = False
+
+
+# Shared by every upload in this process
+face_detector = FaceDetector()
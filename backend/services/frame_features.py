@@ -0,0 +1,165 @@
+import os
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.frame_source import BLUR_SCALE_EXPONENT, downscale_ratio, reference_scale
+
+# Frames stacked per batch; bounds the temporary grayscale/HSV/Laplacian arrays
+FEATURE_BATCH_SIZE = 32
+# A candidate whose dHash is within this many bits (of 64) of the previous kept
+# candidate is a near-duplicate and is dropped before scoring
+THUMBNAIL_DUPLICATE_BITS = int(os.getenv("THUMBNAIL_DUPLICATE_BITS", 4))
+
+# One record per candidate frame
+FEATURE_DTYPE = np.dtype([
+    ('sharpness', 'f8'),
+    ('brightness', 'f8'),
+    ('contrast', 'f8'),
+    ('face_detected', '?'),
+    ('face_count', 'i4'),
+    ('face_prominence', 'f8'),
+    ('composition_score', 'f8'),
+    ('color_vibrancy', 'f8'),
+    ('text_detected', '?'),
+    ('text_visibility', 'f8'),
+    ('dhash', 'u8')
+])
+
+# Takes a BGR frame, returns (has_faces, face_count, prominence)
+FaceDetectFn = Callable[[np.ndarray], Tuple[bool, int, float]]
+
+
+def dhash(image: np.ndarray) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DuplicateFilter:
+    """Drops frames that look the same as the last frame it let through"""
+
+    def __init__(self, max_distance: int = THUMBNAIL_DUPLICATE_BITS):
+        self.max_distance = max_distance
+        self._last: Optional[int] = None
+        self.dropped = 0
+
+    def is_new(self, image: np.ndarray) -> bool:
+        frame_hash = dhash(image)
+        if self._last is not None and hamming(frame_hash, self._last) <= self.max_distance:
+            self.dropped += 1
+            return False
+        self._last = frame_hash
+        return True
+
+
+def feature_dicts(features: np.ndarray) -> List[Dict[str, Any]]:
+    """Feature records as plain dicts of Python scalars, ready for JSON and the cache"""
+    return [{name: record[name].item() for name in features.dtype.names} for record in features]
+
+
+def _mean_std(images: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-frame mean and standard deviation of a stack of single-channel images"""
+    stats = [cv2.meanStdDev(image) for image in images]
+    return (
+        np.array([mean[0, 0] for mean, _ in stats]),
+        np.array([std[0, 0] for _, std in stats])
+    )
+
+
+def _nonzero_share(images: np.ndarray) -> np.ndarray:
+    """Per-frame share of non-zero pixels"""
+    return np.array([cv2.countNonZero(image) for image in images]) / images[0].size
+
+
+class FrameFeatureEngine:
+    """Computes thumbnail features for a batch of equally sized frames in array operations
+
+    Each batch is stacked into one tall image so each colour conversion is a single
+    OpenCV call, and the scoring formulas run over arrays of per-frame statistics.
+    """
+
+    def __init__(self, detect_faces: Optional[FaceDetectFn] = None, batch_size: int = FEATURE_BATCH_SIZE):
+        self.detect_faces = detect_faces
+        self.batch_size = batch_size
+
+    def compute(self, frames: Sequence[np.ndarray], source_long_side: int = 0) -> np.ndarray:
+        """Feature records for BGR frames, in order; frames of different sizes batch separately
+
+        source_long_side is the long side of the video the frames were downscaled from,
+        so sharpness measures as it would at the source; 0 treats them as full size.
+        """
+        features = np.zeros(len(frames), dtype=FEATURE_DTYPE)
+        start = 0
+        while start < len(frames):
+            end = start + 1
+            while end < len(frames) and end - start < self.batch_size and frames[end].shape == frames[start].shape:
+                end += 1
+            features[start:end] = self._compute_batch(np.stack(frames[start:end]), source_long_side)
+            start = end
+        return features
+
+    def _compute_batch(self, batch: np.ndarray, source_long_side: int) -> np.ndarray:
+        n, h, w = batch.shape[:3]
+        features = np.zeros(n, dtype=FEATURE_DTYPE)
+        scale = reference_scale(batch[0])
+        blur_scale = downscale_ratio(batch[0], source_long_side) ** BLUR_SCALE_EXPONENT
+
+        # Colour conversions are per pixel, so the stacked frames convert in one call
+        tall = batch.reshape(n * h, w, 3)
+        gray = cv2.cvtColor(tall, cv2.COLOR_BGR2GRAY).reshape(n, h, w)
+        hsv = cv2.cvtColor(tall, cv2.COLOR_BGR2HSV).reshape(n, h, w, 3)
+
+        # Raw statistics per frame. OpenCV's reductions over each frame's view are far
+        # faster than NumPy axis reductions, which materialise float64 copies of the stack
+        mean_gray, std_gray = _mean_std(gray)
+        laplacian_var = np.array([
+            cv2.meanStdDev(cv2.Laplacian(g, cv2.CV_32F))[1][0, 0] ** 2 for g in gray
+        ]) * blur_scale  # Laplacian variance at the source resolution
+        avg_saturation, _ = _mean_std(hsv[..., 1])
+        _, value_std = _mean_std(hsv[..., 2])
+        composition_edges = np.stack([cv2.Canny(g, 50, 150) for g in gray])
+        # Edges are one pixel wide; rescale their share to the reference resolution
+        edge_density = _nonzero_share(np.stack([cv2.Canny(g, 100, 200) for g in gray])) * scale
+
+        # Scores for the whole batch at once
+        features['sharpness'] = np.minimum(100, laplacian_var / 10)
+        features['brightness'] = 100 - np.abs(mean_gray - 127) / 1.27  # Optimal at 127
+        features['contrast'] = np.minimum(100, std_gray / 0.8)
+        features['color_vibrancy'] = np.minimum(100, (avg_saturation / 2.55) * 0.7 + (value_std / 1.28) * 0.3)
+        features['dhash'] = [dhash(frame) for frame in batch]
+        features['composition_score'] = self._composition(composition_edges, scale)
+        features['text_detected'] = edge_density > 0.1
+        features['text_visibility'] = np.minimum(100, edge_density * 500)
+
+        if self.detect_faces is not None:
+            for i, frame in enumerate(batch):
+                has_faces, face_count, prominence = self.detect_faces(frame)
+                features['face_detected'][i] = has_faces
+                features['face_count'][i] = face_count
+                features['face_prominence'][i] = prominence
+
+        return features
+
+    def _composition(self, edges: np.ndarray, scale: float) -> np.ndarray:
+        """Rule of thirds: edge density around the four intersections"""
+        n, h, w = edges.shape
+        third_h, third_w = h // 3, w // 3
+        region_size = max(2, int(round(50 * scale)))  # 50px at the reference resolution
+
+        score = np.zeros(n)
+        for x, y in [(third_w, third_h), (2 * third_w, third_h), (third_w, 2 * third_h), (2 * third_w, 2 * third_h)]:
+            regions = edges[
+                :,
+                max(0, y - region_size // 2):min(h, y + region_size // 2),
+                max(0, x - region_size // 2):min(w, x + region_size // 2)
+            ]
+            score += _nonzero_share(regions) * scale
+        return np.minimum(100, score * 100)
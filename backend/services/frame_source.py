@@ -0,0 +1,244 @@
+import os
+import re
+import cv2
+import queue
+import ffmpeg
+import threading
+import numpy as np
+from typing import Callable, List, Optional
+
+# Metrics run on frames downscaled so their long side is at most this (0 keeps full size)
+ANALYSIS_LONG_SIDE = int(os.getenv("ANALYSIS_LONG_SIDE", 720))
+# Long side the pixel-based thresholds were tuned at; metrics that depend on pixel
+# size are rescaled to it so scores do not drift with resolution
+REFERENCE_LONG_SIDE = 1920
+# Blur thresholds were tuned on Laplacian variance at the source resolution, which
+# grows as a frame is downscaled: about with the square of the size reduction on soft
+# footage, but only linearly on crisp edges such as text and graphics. This exponent,
+# fit on both, maps variance on a downscaled frame back to the source
+BLUR_SCALE_EXPONENT = 1.5
+
+# showinfo logs each decoded frame's timestamp and size
+SHOWINFO_PATTERN = re.compile(r"pts_time:\s*(?P<pts>-?[\d.]+).*?\bs:(?P<width>\d+)x(?P<height>\d+)")
+
+
+def downscale(image: np.ndarray, long_side: int = ANALYSIS_LONG_SIDE) -> np.ndarray:
+    """Shrink an image so its long side is at most long_side; never upscales"""
+    current = max(image.shape[:2])
+    if long_side <= 0 or current <= long_side:
+        return image
+    scale = long_side / current
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def reference_scale(image: np.ndarray) -> float:
+    """Size of an image relative to the reference resolution"""
+    return max(image.shape[:2]) / REFERENCE_LONG_SIDE
+
+
+def downscale_ratio(image: np.ndarray, source_long_side: int) -> float:
+    """How far an image was shrunk from its source frame; 1.0 when it was not"""
+    if source_long_side <= 0:
+        return 1.0
+    return min(1.0, max(image.shape[:2]) / source_long_side)
+
+
+def normalized_laplacian_var(gray: np.ndarray, source_long_side: int) -> float:
+    """Laplacian variance as it would measure on the frame before downscaling
+
+    Frames that were not downscaled are measured as they are.
+    """
+    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(variance * downscale_ratio(gray, source_long_side) ** BLUR_SCALE_EXPONENT)
+
+
+def normalized_edge_density(edges: np.ndarray) -> float:
+    """Share of edge pixels as it would measure at the reference resolution
+
+    Edges are one pixel wide, so their share of the frame grows as the frame shrinks.
+    """
+    return float(np.count_nonzero(edges) / edges.size * reference_scale(edges))
+
+
+class Frame:
+    """A decoded frame handed to consumers, with lazily cached analysis-size copies"""
+
+    def __init__(self, index: int, timestamp: float, image: np.ndarray):
+        self.index = index
+        self.timestamp = timestamp
+        self.image = image
+        self._analysis = None
+        self._gray = None
+
+    @property
+    def analysis(self) -> np.ndarray:
+        """The frame at analysis resolution, shared by every consumer"""
+        if self._analysis is None:
+            self._analysis = downscale(self.image)
+        return self._analysis
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.analysis, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+
+class FrameConsumer:
+    """Frame range a consumer registered for: indices start, start+step, ... below stop
+
+    A keyframes_only consumer instead gets every keyframe, from a pass that decodes
+    nothing else.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[Frame], None],
+        start: int = 0,
+        stop: Optional[int] = None,
+        step: int = 1,
+        keyframes_only: bool = False
+    ):
+        self.callback = callback
+        self.start = start
+        self.stop = stop
+        self.step = max(1, step)
+        self.keyframes_only = keyframes_only
+        self.fed = False
+
+    def wants(self, index: int) -> bool:
+        if index < self.start or (self.stop is not None and index >= self.stop):
+            return False
+        return (index - self.start) % self.step == 0
+
+    def is_done(self, index: int) -> bool:
+        return self.stop is not None and index >= self.stop
+
+
+class FrameSource:
+    """Decodes a video in one sequential pass and fans frames out to registered consumers"""
+
+    def __init__(self, video_path: str):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._consumers: List[FrameConsumer] = []
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        return self.frame_count / self.fps if self.fps > 0 else 0
+
+    def timestamp(self, index: int) -> float:
+        return index / self.fps if self.fps > 0 else 0.0
+
+    def register(
+        self,
+        callback: Callable[[Frame], None],
+        start: int = 0,
+        stop: Optional[int] = None,
+        step: int = 1,
+        keyframes_only: bool = False
+    ) -> FrameConsumer:
+        """Register a callback for a range of frame indices, or for every keyframe"""
+        if self.frame_count > 0:
+            stop = self.frame_count if stop is None else min(stop, self.frame_count)
+        consumer = FrameConsumer(callback, start, stop, step, keyframes_only)
+        self._consumers.append(consumer)
+        return consumer
+
+    def run(self) -> None:
+        """Feed every consumer that has not been fed yet in a single decode pass"""
+        # Stages on different threads may all ask for the pass; only one decodes
+        with self._lock:
+            self._run_pending()
+
+    def _run_pending(self) -> None:
+        pending = [c for c in self._consumers if not c.fed]
+        keyframe_consumers = [c for c in pending if c.keyframes_only]
+        sequential = [c for c in pending if not c.keyframes_only]
+        if sequential:
+            self._run_sequential(sequential)
+        if keyframe_consumers:
+            self._run_keyframes(keyframe_consumers)
+
+    def _run_sequential(self, pending: List[FrameConsumer]) -> None:
+        # A consumer registered after an earlier pass needs a fresh capture
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.video_path)
+
+        index = 0
+        while not all(c.is_done(index) for c in pending):
+            # grab() advances without converting; only retrieve frames someone wants
+            if not self.cap.grab():
+                break
+
+            wanting = [c for c in pending if c.wants(index)]
+            if wanting:
+                ret, image = self.cap.retrieve()
+                if ret:
+                    frame = Frame(index, self.timestamp(index), image)
+                    for consumer in wanting:
+                        consumer.callback(frame)
+
+            index += 1
+
+        for consumer in pending:
+            consumer.fed = True
+        self.release()
+
+    def _run_keyframes(self, pending: List[FrameConsumer]) -> None:
+        """Decode keyframes only; the decoder skips every other frame without decoding it"""
+        process = (
+            ffmpeg
+            .input(self.video_path, skip_frame="nokey")
+            .filter("showinfo")
+            .output("pipe:", format="rawvideo", pix_fmt="bgr24", vsync="passthrough")
+            .global_args("-nostats", "-hide_banner")
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+
+        # showinfo reports a frame on stderr before the frame is written to stdout;
+        # drain stderr on a thread so neither pipe can fill up and stall the decoder
+        infos: "queue.Queue[Optional[re.Match]]" = queue.Queue()
+
+        def read_infos():
+            for line in process.stderr:
+                match = SHOWINFO_PATTERN.search(line.decode(errors="ignore"))
+                if match:
+                    infos.put(match)
+            infos.put(None)
+
+        reader = threading.Thread(target=read_infos, daemon=True)
+        reader.start()
+        try:
+            while True:
+                info = infos.get()
+                if info is None:
+                    break
+                width, height = int(info["width"]), int(info["height"])
+                data = process.stdout.read(width * height * 3)
+                if len(data) < width * height * 3:
+                    break
+
+                timestamp = max(0.0, float(info["pts"]))
+                image = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3).copy()
+                frame = Frame(int(round(timestamp * self.fps)), timestamp, image)
+                for consumer in pending:
+                    if frame.index >= consumer.start and not consumer.is_done(frame.index):
+                        consumer.callback(frame)
+        finally:
+            process.stdout.close()
+            process.wait()
+            reader.join()
+
+        for consumer in pending:
+            consumer.fed = True
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
@@ -0,0 +1,212 @@
+import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from services.result_cache import json_default
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while every queue slot is taken"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, video_path: Path, platform: str, content_hash: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.video_path = video_path
+        self.platform = platform
+        self.content_hash = content_hash
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "platform": self.platform,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.status == "completed":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class JobStore:
+    """SQLite table of job states, readable by every process that shares the file
+
+    A job runs in the process that accepted its upload, but the status poll can land
+    on any replica; each state change is written here so they can all answer it.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                finished_at REAL
+            )"""
+        )
+        self._conn.commit()
+
+    def put(self, job: "Job") -> None:
+        data = json.dumps(job.to_dict(), default=json_default)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, value, finished_at) VALUES (?, ?, ?)",
+                (job.id, data, job.finished_at)
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def purge(self, cutoff: float) -> None:
+        """Forget jobs that finished before cutoff"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+            self._conn.commit()
+
+
+class JobQueue:
+    """Bounded queue of analysis jobs drained by a fixed pool of worker threads
+
+    With a JobStore, job states are also written there and looked up by get(), so
+    status polls work from any process sharing the store.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str, str, Optional[str]], Dict[str, Any]],
+        num_workers: int = 2,
+        max_queued: int = 10,
+        job_ttl_seconds: float = 3600,
+        store: Optional[JobStore] = None
+    ):
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.job_ttl_seconds = job_ttl_seconds
+        self.store = store
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max_queued)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._avg_duration = 30.0  # Seed estimate until real jobs finish
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+
+    def submit(self, video_path: Path, platform: str, content_hash: Optional[str] = None) -> Job:
+        """Queue a stored upload for analysis, or raise QueueFullError
+
+        content_hash is the upload's SHA-256 when the caller computed it while saving,
+        so the worker does not read the file again to hash it.
+        """
+        self._purge_expired()
+        job = Job(video_path, platform, content_hash)
+        with self._lock:
+            self._jobs[job.id] = job
+        # Stored before queueing, so a worker's "running" is never overwritten by "queued"
+        self._save(job)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            if self.store is not None:
+                self.store.delete(job.id)
+            raise QueueFullError(self.retry_after())
+        return job
+
+    def is_full(self) -> bool:
+        return self._queue.full()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State of a job from this process, or from the store if another one took it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is not None:
+            return self.store.get(job_id)
+        return None
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up"""
+        waves = max(1, math.ceil(self._queue.qsize() / self.num_workers))
+        return max(1, int(self._avg_duration * waves / self.num_workers))
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self._save(job)
+            print(f"🏃 Job {job.id} started ({job.platform})")
+            try:
+                job.result = self.handler(str(job.video_path), job.platform, job.content_hash)
+                job.status = "completed"
+                print(f"✅ Job {job.id} completed")
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                print(f"❌ Job {job.id} failed: {str(e)}")
+                traceback.print_exc()
+            finally:
+                job.finished_at = time.time()
+                self._save(job)
+                # Exponential moving average keeps Retry-After close to recent load
+                duration = job.finished_at - job.started_at
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+                if job.video_path.exists():
+                    job.video_path.unlink()
+                self._queue.task_done()
+
+    def _save(self, job: Job) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.put(job)
+        except sqlite3.Error as e:
+            # Polls to this process still see the job; only other replicas miss the update
+            print(f"⚠️  Could not store state of job {job.id}: {str(e)}")
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.job_ttl_seconds
+        if self.store is not None:
+            self.store.purge(cutoff)
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
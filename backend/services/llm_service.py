@@ -1,7 +1,7 @@
 import os
 import json
 import ollama
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional
 
 class LLMService:
     def __init__(self):
@@ -13,9 +13,16 @@ class LLMService:
         video_metrics: Dict[str, Any],
         audio_metrics: Dict[str, Any],
         transcript: Dict[str, Any],
-        platform: str
+        platform: str,
+        on_result: Optional[Callable[[str, Any], None]] = None
     ) -> Dict[str, Any]:
-        """Generate optimization suggestions using LLM"""
+        """Generate optimization suggestions using LLM
+        
+        on_result, if given, receives each sub-result ("analysis",
+        "music_recommendation", "content_suggestions") as soon as it is ready.
+        """
+        if on_result is None:
+            on_result = lambda name, value: None
         
         # Build context prompt
         prompt = self._build_prompt(video_metrics, audio_metrics, transcript, platform)
@@ -25,6 +32,7 @@ class LLMService:
             response = self._call_ollama(prompt)
         else:
             response = {"error": "Unsupported LLM provider"}
+        on_result("analysis", response)
         
         # Always generate music recommendation for all videos
         print("🎵 Generating background music recommendation...")
@@ -47,6 +55,7 @@ class LLMService:
                 "search_keywords": ["royalty free music", "no copyright", platform.replace('_', ' ')],
                 "best_for": platform.replace('_', ' ').title()
             }
+        on_result("music_recommendation", response['music_recommendation'])
         
         # Generate hashtag and title suggestions
         print("📝 Generating hashtag and title suggestions...")
@@ -72,6 +81,10 @@ class LLMService:
                 "You Have to See This!",
                 "Check Out This Video"
             ]
+        on_result("content_suggestions", {
+            "hashtag_suggestions": response['hashtag_suggestions'],
+            "title_suggestions": response['title_suggestions']
+        })
         
         print(f"📦 Final response keys: {list(response.keys())}")
         return response
@@ -84,6 +97,7 @@ class LLMService:
         platform: str
     ) -> str:
         """Build analysis prompt for LLM"""
+        pacing = video_metrics.get('pacing', {})
         
         platform_rules = {
             "instagram": {
@@ -118,6 +132,7 @@ VIDEO METRICS:
 - Brightness: {video_metrics.get('brightness', {})}
 - Blur Score: {video_metrics.get('blur_score', 0):.1f}
 - Scene Changes: {video_metrics.get('scene_changes', 0)}
+- Pacing: {pacing.get('cuts_per_second', 0):.2f} cuts/s (busiest 5s: {pacing.get('peak_cuts_per_second', 0):.2f} cuts/s)
 - First Frame Quality: {video_metrics.get('first_frame_quality', {})}
 
 AUDIO METRICS:
@@ -252,17 +267,17 @@ Be specific, actionable, and reference timestamps when relevant."""
         duration = video_metrics.get('duration', 0)
         brightness = video_metrics.get('brightness', {})
         
-        # Determine pacing
-        if duration > 0:
-            pacing = scene_changes / duration
-        else:
-            pacing = 0
+        # Cuts per second over the whole video
+        pacing = video_metrics.get('pacing', {}).get('cuts_per_second', 0)
         
         # Check if video has audio
         has_audio = audio_metrics.get('has_audio', True)
         is_silent_or_low = audio_metrics.get('is_silent_or_low', False)
         avg_db = audio_metrics.get('loudness', {}).get('average_db', -20)
         
+        # Tempo measured from the soundtrack's onset envelope; meaningless for silent clips
+        measured_bpm = 0 if is_silent_or_low else audio_metrics.get('tempo', {}).get('bpm', 0)
+        
         # Build music recommendation prompt
         prompt = f"""You are a music expert for {platform.replace('_', ' ').title()} content.
 
@@ -276,6 +291,7 @@ VIDEO ANALYSIS:
 - Platform: {platform}
 - Has Audio: {"No" if is_silent_or_low else "Yes"}
 - Audio Level: {avg_db:.1f}dB
+- Measured Tempo: {f"{measured_bpm:.0f} BPM" if measured_bpm > 0 else "Not measurable"}
 
 Provide music recommendation in this EXACT JSON format:
 {{
@@ -297,6 +313,7 @@ Consider:
 - {platform} trends and popular music styles
 - If video has audio, suggest complementary background music
 - If video has no audio, suggest primary background music
+- If a tempo was measured, keep bpm_range close to it (or its half/double time)
 
 Respond with ONLY the JSON, no markdown, no explanations."""
 
@@ -342,7 +359,7 @@ Respond with ONLY the JSON, no markdown, no explanations."""
             # Return fallback recommendation based on video characteristics
             if pacing > 0.5:
                 # Fast-paced video
-                return {
+                fallback = {
                     "genre": "Upbeat Pop",
                     "mood": "Energetic, Dynamic",
                     "bpm_range": "120-140 BPM",
@@ -354,7 +371,7 @@ Respond with ONLY the JSON, no markdown, no explanations."""
                 }
             elif pacing > 0.2:
                 # Medium-paced video
-                return {
+                fallback = {
                     "genre": "Indie Pop",
                     "mood": "Uplifting, Positive",
                     "bpm_range": "100-120 BPM",
@@ -366,7 +383,7 @@ Respond with ONLY the JSON, no markdown, no explanations."""
                 }
             else:
                 # Slow-paced video
-                return {
+                fallback = {
                     "genre": "Lo-fi Instrumental",
                     "mood": "Calm, Professional",
                     "bpm_range": "~95 BPM",
@@ -376,6 +393,11 @@ Respond with ONLY the JSON, no markdown, no explanations."""
                     "search_keywords": ["royalty free lofi", "no copyright chill music", f"{platform.replace('_', ' ')} lofi"],
                     "best_for": platform.replace('_', ' ').title()
                 }
+            
+            # Prefer the measured tempo over the pacing guess
+            if measured_bpm > 0:
+                fallback["bpm_range"] = f"{measured_bpm - 5:.0f}-{measured_bpm + 5:.0f} BPM"
+            return fallback
 
 
     def _generate_content_suggestions(
@@ -393,11 +415,8 @@ Respond with ONLY the JSON, no markdown, no explanations."""
         brightness = video_metrics.get('brightness', {})
         transcript_text = transcript.get('text', 'No speech detected')
         
-        # Determine pacing
-        if duration > 0:
-            pacing = scene_changes / duration
-        else:
-            pacing = 0
+        # Cuts per second over the whole video
+        pacing = video_metrics.get('pacing', {}).get('cuts_per_second', 0)
         
         # Build content suggestion prompt
         prompt = f"""You are a {platform.replace('_', ' ').title()} content expert.
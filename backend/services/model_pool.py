@@ -0,0 +1,63 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List
+
+
+class ModelPool:
+    """Thread-safe pool of up to `size` model instances, loaded once and lent to callers"""
+
+    def __init__(self, loader: Callable[[], Any], size: int = 1, name: str = "model"):
+        self.loader = loader
+        self.size = max(1, size)
+        self.name = name
+        self._idle: List[Any] = []
+        self._loaded = 0
+        # Signalled whenever an instance is returned or a load slot frees up
+        self._available = threading.Condition()
+
+    @property
+    def loaded(self) -> int:
+        return self._loaded
+
+    def preload(self) -> None:
+        """Load every instance up front instead of on first use"""
+        while True:
+            with self._available:
+                if self._loaded >= self.size:
+                    return
+                self._loaded += 1
+            self._release(self._load())
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Borrow an instance, loading one if the pool is not yet full, else waiting"""
+        model = self._take()
+        try:
+            yield model
+        finally:
+            self._release(model)
+
+    def _take(self) -> Any:
+        with self._available:
+            while not self._idle and self._loaded >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._loaded += 1
+        return self._load()
+
+    def _release(self, model: Any) -> None:
+        with self._available:
+            self._idle.append(model)
+            self._available.notify()
+
+    def _load(self) -> Any:
+        print(f"📦 Loading {self.name} ({self._loaded}/{self.size})...")
+        try:
+            return self.loader()
+        except Exception:
+            # Free the slot and wake a waiter, which retries the load in its place
+            with self._available:
+                self._loaded -= 1
+                self._available.notify()
+            raise
@@ -0,0 +1,154 @@
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from services.frame_features import (
+    FEATURE_BATCH_SIZE,
+    DuplicateFilter,
+    FrameFeatureEngine,
+    feature_dicts
+)
+from services.face_detector import face_detector
+from services.frame_source import downscale
+
+# Worker processes that score thumbnail candidates, each over its own time range;
+# 1 keeps scoring in the shared decode pass
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 1))
+# Ranges shorter than this many candidates are not worth a worker's seek
+MIN_RANGE_CANDIDATES = 8
+# Seeking decodes forward from the previous keyframe, so nearby frames are reached
+# faster by decoding through the gap
+SEEK_MIN_GAP_SECONDS = 4.0
+
+# Set in each worker process by _init_worker
+_worker_engine: Optional[FrameFeatureEngine] = None
+
+
+def _init_worker(cv_threads: int) -> None:
+    global _worker_engine
+    # Workers already use every core between them; stop OpenCV oversubscribing
+    cv2.setNumThreads(cv_threads)
+    face_detector.preload()
+    _worker_engine = FrameFeatureEngine(detect_faces=face_detector.analyze)
+
+
+def _worker_ready() -> bool:
+    return _worker_engine is not None
+
+
+def _score_range(video_path: str, start: int, stop: int, step: int, fps: float) -> List[Tuple[float, Dict[str, Any]]]:
+    return score_windows(_worker_engine, video_path, [(start, stop)], step, fps)
+
+
+def score_windows(
+    engine: FrameFeatureEngine,
+    video_path: str,
+    windows: List[Tuple[int, int]],
+    step: int,
+    fps: float,
+    skip_duplicates: bool = True
+) -> List[Tuple[float, Dict[str, Any]]]:
+    """Score every step-th frame of each [start, stop) window from a single capture
+
+    Windows are visited in order. A seek re-decodes from the previous keyframe, so
+    gaps shorter than SEEK_MIN_GAP_SECONDS are decoded through instead. With
+    skip_duplicates, near-duplicates of the previous kept frame are dropped unscored.
+    Frames are scored a batch at a time and then dropped, so only features are kept.
+    """
+    scored: List[Tuple[float, Dict[str, Any]]] = []
+    batch: List[Tuple[float, np.ndarray]] = []
+    duplicates = DuplicateFilter()
+
+    def flush():
+        features = engine.compute([image for _, image in batch], source_long_side)
+        scored.extend(zip([timestamp for timestamp, _ in batch], feature_dicts(features)))
+        batch.clear()
+
+    cap = cv2.VideoCapture(video_path)
+    source_long_side = max(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    position = 0
+    try:
+        for start, stop in sorted(windows):
+            if start < position or start - position > SEEK_MIN_GAP_SECONDS * fps:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                position = start
+            # grab() advances without converting; only retrieve sampled frames
+            while position < stop and cap.grab():
+                index = position
+                position += 1
+                if index < start or (index - start) % step:
+                    continue
+                ret, image = cap.retrieve()
+                if not ret:
+                    continue
+                image = downscale(image)
+                if not skip_duplicates or duplicates.is_new(image):
+                    batch.append((index / fps, image))
+                    if len(batch) >= FEATURE_BATCH_SIZE:
+                        flush()
+            if position < stop:
+                break  # end of stream
+        if batch:
+            flush()
+    finally:
+        cap.release()
+    return scored
+
+
+def split_ranges(frame_count: int, step: int, num_ranges: int) -> List[Tuple[int, int]]:
+    """Cut [0, frame_count) into contiguous ranges whose starts fall on the sampling grid"""
+    num_candidates = (frame_count + step - 1) // step
+    num_ranges = max(1, min(num_ranges, num_candidates // MIN_RANGE_CANDIDATES))
+    bounds = [round(i * num_candidates / num_ranges) * step for i in range(num_ranges)] + [frame_count]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class ParallelFrameScorer:
+    """Scores thumbnail candidates over time ranges of a video in a pool of worker processes"""
+
+    def __init__(self, workers: int = THUMBNAIL_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def preload(self) -> None:
+        """Start every worker and load its face detector now rather than on the first upload"""
+        executor = self._get_executor()
+        for future in [executor.submit(_worker_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def score(self, video_path: str, frame_count: int, fps: float, step: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """(timestamp, features) for frames 0, step, 2*step, ... in timestamp order"""
+        ranges = split_ranges(frame_count, step, self.workers)
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_score_range, video_path, start, stop, step, fps)
+            for start, stop in ranges
+        ]
+
+        print(f"🧩 Scoring thumbnail candidates in {len(futures)} ranges on {self.workers} workers")
+        scored: List[Tuple[float, Dict[str, Any]]] = []
+        for future in futures:
+            scored.extend(future.result())
+        return scored
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork: the server process already runs threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(max(1, (os.cpu_count() or 1) // self.workers),)
+                )
+            return self._executor
@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class Stage:
+    """A pipeline node: calls func with its inputs as keyword arguments and stores its outputs"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Sequence[str] = (),
+        outputs: Sequence[str] = ()
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+    def store(self, value: Any, results: Dict[str, Any]) -> None:
+        """Single-output stages return the value, multi-output stages return a tuple"""
+        if len(self.outputs) == 1:
+            results[self.outputs[0]] = value
+        elif self.outputs:
+            for name, item in zip(self.outputs, value):
+                results[name] = item
+
+
+class Pipeline:
+    """Runs stages on a worker pool as soon as every declared input is available"""
+
+    def __init__(self, stages: List[Stage], executor: Optional[Executor] = None, max_workers: Optional[int] = None):
+        self.stages = stages
+        self.executor = executor
+        self.max_workers = max_workers
+        self.timings: Dict[str, float] = {}
+        self._validate()
+
+    def _validate(self) -> None:
+        produced = set()
+        for stage in self.stages:
+            for name in stage.outputs:
+                if name in produced:
+                    raise ValueError(f"Output '{name}' is produced by more than one stage")
+                produced.add(name)
+
+    def run(self, on_output: Optional[Callable[[str, Any], None]] = None, **initial: Any) -> Dict[str, Any]:
+        """Execute the graph and return every produced value keyed by output name
+
+        Values passed in as initial (e.g. from a cache) skip the stages that produce
+        them, along with upstream stages that only fed those skipped stages.
+        on_output, if given, is called with each output as soon as its stage finishes.
+        """
+        active = self._active_stages(initial)
+        produced = {name for stage in active for name in stage.outputs}
+        missing = {
+            name for stage in active for name in stage.inputs
+            if name not in produced and name not in initial
+        }
+        if missing:
+            raise ValueError(f"No stage produces inputs: {sorted(missing)}")
+
+        executor = self.executor or ThreadPoolExecutor(
+            max_workers=self.max_workers or len(self.stages),
+            thread_name_prefix="pipeline"
+        )
+        results: Dict[str, Any] = dict(initial)
+        pending = list(active)
+        running: Dict[Future, Stage] = {}
+
+        try:
+            while pending or running:
+                # Submit every stage whose inputs now exist
+                for stage in [s for s in pending if all(i in results for i in s.inputs)]:
+                    pending.remove(stage)
+                    kwargs = {name: results[name] for name in stage.inputs}
+                    running[executor.submit(self._timed, stage, kwargs)] = stage
+
+                if not running:
+                    names = [s.name for s in pending]
+                    raise RuntimeError(f"Pipeline stalled with unsatisfiable stages: {names}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    stage.store(future.result(), results)
+                    if on_output is not None:
+                        for name in stage.outputs:
+                            on_output(name, results[name])
+        finally:
+            for future in running:
+                future.cancel()
+            if self.executor is None:
+                executor.shutdown(wait=False)
+
+        return results
+
+    def _active_stages(self, initial: Dict[str, Any]) -> List[Stage]:
+        consumers: Dict[str, List[Stage]] = {}
+        for stage in self.stages:
+            for name in stage.inputs:
+                consumers.setdefault(name, []).append(stage)
+
+        active = [
+            s for s in self.stages
+            if not (s.outputs and all(name in initial for name in s.outputs))
+        ]
+        changed = True
+        while changed:
+            changed = False
+            for stage in list(active):
+                downstream = [c for name in stage.outputs for c in consumers.get(name, [])]
+                if downstream and not any(c in active for c in downstream):
+                    active.remove(stage)
+                    changed = True
+        return active
+
+    def _timed(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return stage.func(**kwargs)
+        finally:
+            self.timings[stage.name] = time.perf_counter() - start
@@ -0,0 +1,109 @@
+import os
+import re
+import hashlib
+import threading
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# "webp" is roughly a third smaller than JPEG at the same quality; "jpg" for old clients
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "webp").lower()
+PREVIEW_QUALITY = 80
+# Every preview is stored at each of these sizes (16:9); "small" fills preview_image
+PREVIEW_SIZES = {"small": (320, 180), "large": (1280, 720)}
+# Where main.py serves the store
+PREVIEW_URL_PREFIX = "/api/previews"
+
+MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+ENCODE_PARAMS = {"webp": [cv2.IMWRITE_WEBP_QUALITY, PREVIEW_QUALITY], "jpg": [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_QUALITY]}
+# Names are the SHA-256 of the file contents; anything else is not ours to serve
+NAME_PATTERN = re.compile(r"^(?P<digest>[0-9a-f]{64})\.(?P<ext>webp|jpg)$")
+
+
+class PreviewStore:
+    """Content-addressed directory of encoded preview images with size-bounded LRU eviction
+
+    A file's name is the hash of its bytes, so a name never changes meaning and can be
+    cached by browsers and CDNs forever. Serving a file refreshes its mtime, which is
+    what eviction orders by.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 500 * 1024 * 1024, image_format: str = PREVIEW_FORMAT):
+        if image_format not in MEDIA_TYPES:
+            raise ValueError(f"Unknown PREVIEW_FORMAT '{image_format}', expected one of {sorted(MEDIA_TYPES)}")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self._lock = threading.Lock()
+        self._total = sum(path.stat().st_size for path in self.root.iterdir() if NAME_PATTERN.match(path.name))
+
+    def save_frame(self, frame: np.ndarray) -> Dict[str, str]:
+        """Encode a frame at every preview size and return the URL of each"""
+        urls = {}
+        for size_name, size in PREVIEW_SIZES.items():
+            preview = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode(f".{self.image_format}", preview, ENCODE_PARAMS[self.image_format])
+            if not ok:
+                raise RuntimeError(f"Could not encode preview as {self.image_format}")
+            urls[size_name] = f"{PREVIEW_URL_PREFIX}/{self.put(buffer.tobytes())}"
+        return urls
+
+    def put(self, data: bytes) -> str:
+        """Store bytes under the hash of their contents and return the file name"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{self.image_format}"
+        path = self.root / name
+        with self._lock:
+            if path.exists():
+                os.utime(path)
+                return name
+            # Write then rename, so a concurrent reader never sees a partial file
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._total += len(data)
+            self._evict()
+        return name
+
+    def path(self, name: str) -> Optional[Path]:
+        """Path of a stored preview, or None for unknown or malformed names"""
+        if not NAME_PATTERN.match(name):
+            return None
+        path = self.root / name
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    @staticmethod
+    def etag(name: str) -> str:
+        return f'"{NAME_PATTERN.match(name)["digest"]}"'
+
+    @staticmethod
+    def media_type(name: str) -> str:
+        return MEDIA_TYPES[NAME_PATTERN.match(name)["ext"]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = sum(1 for path in self.root.iterdir() if NAME_PATTERN.match(path.name))
+            return {"entries": entries, "bytes": self._total}
+
+    def _evict(self) -> None:
+        """Delete least recently used previews until the store fits in max_bytes"""
+        if self._total <= self.max_bytes:
+            return
+
+        files = sorted(
+            (path.stat().st_mtime, path) for path in self.root.iterdir() if NAME_PATTERN.match(path.name)
+        )
+        for _, path in files:
+            if self._total <= self.max_bytes:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._total -= size
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def json_default(value: Any) -> Any:
+    """Analyzer outputs carry numpy scalars (np.bool_, np.float64); store them as builtins"""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResultCache:
+    """Persistent SQLite cache of analysis responses with size-bounded LRU eviction"""
+
+    def __init__(self, db_path: Path, max_bytes: int = 200 * 1024 * 1024):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_access ON results(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(content_hash: str, **parts: Any) -> str:
+        """Combine the video hash with every setting that changes the result"""
+        fields = [content_hash] + [f"{name}={parts[name]}" for name in sorted(parts)]
+        return hashlib.sha256("|".join(fields).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        data = json.dumps(value, default=json_default)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        return {"entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
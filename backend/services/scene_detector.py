@@ -0,0 +1,99 @@
+import os
+import cv2
+import numpy as np
+from typing import Any, Dict, List
+
+from services.frame_source import Frame, FrameSource
+
+# Frames per second of video that are compared; cuts are located to 1 / this
+SCENE_SAMPLE_FPS = float(os.getenv("SCENE_SAMPLE_FPS", 10))
+# Width frames are shrunk to before differencing; cuts survive heavy downsampling
+SCENE_FRAME_WIDTH = 64
+
+# A cut is a frame difference that stands SCENE_RATIO times above the average of its
+# neighbours within SCENE_WINDOW_SECONDS on either side, and at least SCENE_MIN_SCORE
+# (mean absolute difference, 0-255) regardless of context
+SCENE_WINDOW_SECONDS = 1.0
+SCENE_RATIO = 3.0
+SCENE_MIN_SCORE = 12.0
+# Cuts closer together than this (flashes, strobes) count once
+SCENE_MIN_LENGTH_SECONDS = 0.5
+
+# Cuts-per-second curve: one point per second, averaged over a centred window
+PACING_RESOLUTION_SECONDS = 1.0
+PACING_WINDOW_SECONDS = 5.0
+
+
+class SceneDetector:
+    """Finds hard cuts over the whole video from tiny frames fed by the shared decode pass"""
+
+    def __init__(self, source: FrameSource, sample_fps: float = SCENE_SAMPLE_FPS):
+        self.source = source
+        step = max(1, int(round(source.fps / sample_fps))) if source.fps > 0 else 1
+        self.sample_seconds = step / source.fps if source.fps > 0 else 1.0
+
+        self._timestamps: List[float] = []
+        self._scores: List[float] = []
+        self._prev_small = None
+        source.register(self._on_frame, step=step)
+
+    def _on_frame(self, frame: Frame) -> None:
+        height, width = frame.image.shape[:2]
+        size = (SCENE_FRAME_WIDTH, max(1, int(round(height * SCENE_FRAME_WIDTH / width))))
+        small = cv2.resize(frame.image, size, interpolation=cv2.INTER_AREA)
+
+        if self._prev_small is not None:
+            self._timestamps.append(frame.timestamp)
+            self._scores.append(float(np.mean(cv2.absdiff(small, self._prev_small))))
+        self._prev_small = small
+
+    def cuts(self) -> List[float]:
+        """Timestamps (seconds) of the first frame after each detected cut"""
+        if not self._scores:
+            return []
+
+        scores = np.asarray(self._scores)
+        window = max(1, int(round(SCENE_WINDOW_SECONDS / self.sample_seconds)))
+
+        # Average of the neighbours on both sides, excluding the score itself
+        sums = np.concatenate(([0.0], np.cumsum(scores)))
+        index = np.arange(len(scores))
+        lo = np.maximum(0, index - window)
+        hi = np.minimum(len(scores), index + window + 1)
+        neighbour_count = np.maximum(1, hi - lo - 1)
+        neighbour_mean = (sums[hi] - sums[lo] - scores) / neighbour_count
+
+        # Floor the context so a cut out of a static shot is judged on SCENE_MIN_SCORE
+        is_cut = (scores >= SCENE_MIN_SCORE) & (scores >= SCENE_RATIO * np.maximum(neighbour_mean, 1.0))
+
+        cuts: List[float] = []
+        for i in np.flatnonzero(is_cut):
+            timestamp = self._timestamps[i]
+            if cuts and timestamp - cuts[-1] < SCENE_MIN_LENGTH_SECONDS:
+                continue
+            cuts.append(timestamp)
+        return cuts
+
+    def pacing(self, cuts: List[float], duration: float) -> Dict[str, Any]:
+        """Average cut rate and a smoothed cuts-per-second curve over the video"""
+        num_points = max(1, int(np.ceil(duration / PACING_RESOLUTION_SECONDS)))
+        counts = np.bincount(
+            np.minimum((np.asarray(cuts) / PACING_RESOLUTION_SECONDS).astype(int), num_points - 1),
+            minlength=num_points
+        ) if cuts else np.zeros(num_points)
+
+        window = max(1, int(round(PACING_WINDOW_SECONDS / PACING_RESOLUTION_SECONDS)))
+        kernel = np.ones(window)
+        # Normalise by the window actually covered so the ends are not underestimated
+        covered = np.convolve(np.ones(num_points), kernel, mode="same") * PACING_RESOLUTION_SECONDS
+        curve = np.convolve(counts, kernel, mode="same") / covered
+
+        return {
+            "cuts_per_second": len(cuts) / duration if duration > 0 else 0.0,
+            "peak_cuts_per_second": float(curve.max()),
+            "curve": {
+                "resolution": PACING_RESOLUTION_SECONDS,
+                "window": PACING_WINDOW_SECONDS,
+                "cuts_per_second": np.round(curve, 3).tolist()
+            }
+        }
@@ -1,279 +1,362 @@
+import os
 import cv2
 import numpy as np
 import base64
-from typing import List, Tuple, Dict, Any
-from pathlib import Path
+import heapq
+from typing import List, Tuple, Dict, Any, Optional
+
+from services.frame_features import (
+    DuplicateFilter,
+    FrameFeatureEngine,
+    feature_dicts,
+    hamming
+)
+from services.face_detector import FaceDetector, face_detector as shared_face_detector
+from services.frame_source import Frame, FrameSource, downscale
+from services.parallel_scoring import ParallelFrameScorer, score_windows
+from services.preview_store import PreviewStore
+
+# "interval" samples a frame every interval_seconds in the shared decode pass;
+# "keyframes" decodes only the stream's keyframes, much faster on long videos;
+# "coarse_to_fine" scans densely with cheap features, then fully scores only the
+# neighbourhoods of the best few frames
+THUMBNAIL_SAMPLING = os.getenv("THUMBNAIL_SAMPLING", "interval").lower()
+
+# Coarse pass: one tiny frame every THUMBNAIL_COARSE_INTERVAL seconds
+THUMBNAIL_COARSE_INTERVAL = float(os.getenv("THUMBNAIL_COARSE_INTERVAL", 0.5))
+THUMBNAIL_COARSE_LONG_SIDE = 320
+# Fine pass: this many seeds, at least interval_seconds apart, each refined with
+# THUMBNAIL_REFINE_SAMPLES frames spanning one coarse interval around it
+THUMBNAIL_REFINE_SEEDS = int(os.getenv("THUMBNAIL_REFINE_SEEDS", 8))
+THUMBNAIL_REFINE_SAMPLES = 5
+
+# Suggestions must differ from every better pick by at least this many dHash bits
+# and this many seconds
+THUMBNAIL_MIN_DISTANCE_BITS = int(os.getenv("THUMBNAIL_MIN_DISTANCE_BITS", 10))
+THUMBNAIL_MIN_GAP_SECONDS = float(os.getenv("THUMBNAIL_MIN_GAP_SECONDS", 1.0))
+
+# Features that contribute to the combined score, in weight-matrix column order
+SCORED_FEATURES = [
+    'sharpness',
+    'brightness',
+    'contrast',
+    'face_prominence',
+    'composition_score',
+    'color_vibrancy'
+]
+
+# Platform-specific weights
+PLATFORM_WEIGHTS = {
+    'instagram': {
+        'sharpness': 0.20,
+        'brightness': 0.15,
+        'contrast': 0.10,
+        'face_prominence': 0.25,  # Instagram loves faces
+        'composition_score': 0.15,
+        'color_vibrancy': 0.15
+    },
+    'youtube_shorts': {
+        'sharpness': 0.25,
+        'brightness': 0.15,
+        'contrast': 0.15,
+        'face_prominence': 0.10,
+        'composition_score': 0.20,  # YouTube values composition
+        'color_vibrancy': 0.15
+    },
+    'other': {
+        'sharpness': 0.20,
+        'brightness': 0.15,
+        'contrast': 0.15,
+        'face_prominence': 0.15,
+        'composition_score': 0.20,
+        'color_vibrancy': 0.15
+    }
+}
+
+
+def weight_matrix(platforms: List[str]) -> np.ndarray:
+    """Stack platform weights into a (features x platforms) matrix"""
+    return np.array([
+        [PLATFORM_WEIGHTS.get(platform, PLATFORM_WEIGHTS['other'])[feature] for platform in platforms]
+        for feature in SCORED_FEATURES
+    ])
+
+
+def feature_matrix(frame_features: List[Dict[str, Any]]) -> np.ndarray:
+    """Stack the scored features of every frame into a (frames x features) matrix"""
+    return np.array([
+        [float(frame_data['features'][feature]) for feature in SCORED_FEATURES]
+        for frame_data in frame_features
+    ]).reshape(len(frame_features), len(SCORED_FEATURES))
+
+
+def score_frames(frame_features: List[Dict[str, Any]], platforms: List[str]) -> np.ndarray:
+    """Rescore frames for several platforms at once, returning a (frames x platforms) array"""
+    return feature_matrix(frame_features) @ weight_matrix(platforms)
+
+
+# Shared by every upload so worker processes start once
+parallel_scorer = ParallelFrameScorer()
+
 
 class ThumbnailSuggester:
-    def __init__(self, video_path: str, platform: str):
+    def __init__(
+        self,
+        video_path: str,
+        platform: str,
+        frame_source: Optional[FrameSource] = None,
+        interval_seconds: float = 2.0,
+        sampling: Optional[str] = None,
+        scorer: Optional[ParallelFrameScorer] = None,
+        preview_store: Optional[PreviewStore] = None,
+        face_detector: Optional[FaceDetector] = None
+    ):
         self.video_path = video_path
         self.platform = platform
-        self.cap = cv2.VideoCapture(video_path)
-        
-        # Load face detection cascade
-        try:
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
-        except:
-            print("⚠️  Face detection cascade not found, face detection will be disabled")
-            self.face_cascade = None
+        self.source = frame_source or FrameSource(video_path)
+        self.interval_seconds = interval_seconds
+        self.sampling = (sampling or THUMBNAIL_SAMPLING).lower()
+        self.scorer = scorer or parallel_scorer
+        # Previews go to the store and are returned as URLs; without one they are inlined
+        self.preview_store = preview_store
+        # Interval sampling can instead be scored over time ranges in worker processes,
+        # each decoding its own range, independently of the shared pass
+        self.parallel = self.sampling == "interval" and self.scorer.enabled and self.source.fps > 0
+
+        # Register for key frames so a shared source collects them in its single pass.
+        # Frames are scored a batch at a time as they arrive and then dropped, so only
+        # one batch of images is ever resident however long the video is
+        self._pending: List[Tuple[float, np.ndarray]] = []
+        self._scored: List[Dict[str, Any]] = []
+        self._last_timestamp: Optional[float] = None
+        self._duplicates = DuplicateFilter()
+        self._key_frame_consumer = None
+        if self.source.fps > 0 and not self.parallel:
+            if self.sampling == "keyframes":
+                self._key_frame_consumer = self.source.register(self._on_key_frame, keyframes_only=True)
+            elif self.sampling == "coarse_to_fine":
+                self._key_frame_consumer = self.source.register(
+                    self._on_coarse_frame,
+                    step=max(1, int(round(self.source.fps * THUMBNAIL_COARSE_INTERVAL)))
+                )
+            else:
+                self._key_frame_consumer = self.source.register(
+                    self._on_key_frame,
+                    step=int(self.source.fps * interval_seconds)
+                )
+        
+        # The detector's model is loaded once per process, not per upload
+        self.face_detector = face_detector or shared_face_detector
+        self.feature_engine = FrameFeatureEngine(detect_faces=self.face_detector.analyze)
+        # Face detection is the one feature too costly for every frame of a dense scan
+        self.coarse_engine = FrameFeatureEngine()
     
     def generate_suggestions(self, num_suggestions: int = 5) -> List[Dict[str, Any]]:
         """Generate top N thumbnail suggestions from video"""
         print(f"\n🖼️  Generating thumbnail suggestions...")
         
-        # Extract key frames
-        frames = self._extract_key_frames(interval_seconds=2.0)
-        print(f"✅ Extracted {len(frames)} key frames")
+        frame_features = self.extract_frame_features()
+        return self.rank_frames(frame_features, self.platform, num_suggestions)
+    
+    def extract_frame_features(self) -> List[Dict[str, Any]]:
+        """Score every key frame on platform-independent features"""
+        if self.parallel:
+            return self._extract_frame_features_parallel()
+        
+        if self._key_frame_consumer is None:
+            return []
+        
+        # No-op if a shared source already decoded (and scored) for us
+        self.source.run()
+        self._score_pending()
+        if self.sampling == "coarse_to_fine":
+            return self._refine(self._scored)
+        print(f"✅ Scored {len(self._scored)} key frames ({self._duplicates.dropped} near-duplicates skipped)")
+        return self._scored
+    
+    def _extract_frame_features_parallel(self) -> List[Dict[str, Any]]:
+        """Score key frames across time ranges in worker processes; frames stay in the workers"""
+        scored = self.scorer.score(
+            self.video_path,
+            self.source.frame_count,
+            self.source.fps,
+            max(1, int(self.source.fps * self.interval_seconds))
+        )
+        print(f"✅ Scored {len(scored)} key frames")
         
-        if not frames:
+        return [{'timestamp': timestamp, 'features': features} for timestamp, features in scored]
+    
+    def rank_frames(
+        self,
+        frame_features: List[Dict[str, Any]],
+        platform: str,
+        num_suggestions: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Pick the top N frames for a platform from precomputed features"""
+        if not frame_features:
             print("❌ No frames extracted")
             return []
         
-        # Score each frame
-        scored_frames = []
-        for timestamp, frame in frames:
-            quality_metrics = self._score_frame_quality(frame)
-            face_data = self._detect_faces(frame)
-            composition_score = self._score_composition(frame)
-            color_score = self._score_color_vibrancy(frame)
-            text_data = self._detect_text_overlay(frame)
-            
-            # Combine all metrics
-            combined_score = self._calculate_combined_score({
-                'sharpness': quality_metrics['sharpness'],
-                'brightness': quality_metrics['brightness'],
-                'contrast': quality_metrics['contrast'],
-                'face_detected': face_data[0],
-                'face_prominence': face_data[2],
-                'composition_score': composition_score,
-                'color_vibrancy': color_score,
-                'text_visibility': text_data[1]
-            }, self.platform)
-            
-            scored_frames.append({
-                'timestamp': timestamp,
-                'frame': frame,
-                'score': combined_score,
+        scores = self._calculate_combined_score(feature_matrix(frame_features), platform)
+        
+        top_frames = []
+        for score, frame_data in self._diverse_top(scores, frame_features, num_suggestions):
+            features = frame_data['features']
+            top_frames.append({
+                'timestamp': frame_data['timestamp'],
+                'score': float(score),
                 'quality_metrics': {
-                    'sharpness': quality_metrics['sharpness'],
-                    'brightness': quality_metrics['brightness'],
-                    'contrast': quality_metrics['contrast'],
-                    'face_detected': face_data[0],
-                    'face_count': face_data[1],
-                    'composition_score': composition_score,
-                    'color_vibrancy': color_score
+                    'sharpness': features['sharpness'],
+                    'brightness': features['brightness'],
+                    'contrast': features['contrast'],
+                    'face_detected': features['face_detected'],
+                    'face_count': features['face_count'],
+                    'composition_score': features['composition_score'],
+                    'color_vibrancy': features['color_vibrancy']
                 }
             })
         
-        # Sort by score and select top N
-        scored_frames.sort(key=lambda x: x['score'], reverse=True)
-        top_frames = scored_frames[:num_suggestions]
-        
-        # Mark the best one as recommended
-        if top_frames:
-            top_frames[0]['is_recommended'] = True
-        
         # Generate preview images and reasoning
         suggestions = []
-        for i, frame_data in enumerate(top_frames):
-            preview_image = self._generate_preview_image(frame_data['frame'])
-            reasoning = self._generate_reasoning(frame_data, i == 0)
+        for frame_data in top_frames:
+            # Candidates keep no images; decode just the chosen frame again at full
+            # resolution for its preview. A suggestion without a preview is no use
+            # to the gallery, so one whose frame cannot be read back is dropped
+            frame = self._read_frame_at(frame_data['timestamp'])
+            if frame is None:
+                print(f"⚠️  Could not re-read frame at {frame_data['timestamp']:.2f}s, skipping suggestion")
+                continue
+            previews = self._generate_previews(frame)
+            # The best suggestion left is the recommended one
+            is_best = not suggestions
+            reasoning = self._generate_reasoning(frame_data, is_best)
             
             suggestions.append({
                 'timestamp': frame_data['timestamp'],
                 'score': round(frame_data['score'], 1),
-                'preview_image': preview_image,
+                'preview_image': previews['small'],
+                'preview_images': previews,
                 'reasoning': reasoning,
-                'is_recommended': frame_data.get('is_recommended', False),
+                'is_recommended': is_best,
                 'quality_metrics': frame_data['quality_metrics']
             })
         
-        self.cap.release()
         print(f"✅ Generated {len(suggestions)} thumbnail suggestions")
         return suggestions
     
-    def _extract_key_frames(self, interval_seconds: float = 2.0) -> List[Tuple[float, np.ndarray]]:
-        """Extract frames at regular intervals throughout video"""
-        frames = []
-        fps = self.cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        if fps <= 0:
-            return frames
-        
-        frame_interval = int(fps * interval_seconds)
-        
-        for frame_num in range(0, total_frames, frame_interval):
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-            ret, frame = self.cap.read()
-            
-            if ret:
-                timestamp = frame_num / fps
-                frames.append((timestamp, frame))
-        
-        return frames
-    
-    def _score_frame_quality(self, frame: np.ndarray) -> Dict[str, float]:
-        """Score frame based on visual quality metrics"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Sharpness (Laplacian variance)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        sharpness = min(100, laplacian_var / 10)  # Normalize to 0-100
-        
-        # Brightness
-        brightness = np.mean(gray)
-        brightness_score = 100 - abs(brightness - 127) / 1.27  # Optimal at 127
-        
-        # Contrast (standard deviation)
-        contrast = np.std(gray)
-        contrast_score = min(100, contrast / 0.8)  # Normalize to 0-100
-        
-        return {
-            'sharpness': float(sharpness),
-            'brightness': float(brightness_score),
-            'contrast': float(contrast_score)
-        }
-    
-    def _detect_faces(self, frame: np.ndarray) -> Tuple[bool, int, float]:
-        """Detect faces and return (has_faces, face_count, prominence_score)"""
-        if self.face_cascade is None:
-            return (False, 0, 0.0)
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
+    def _on_key_frame(self, frame: Frame) -> None:
+        # Stream keyframes can be closer together than the interval; keep one per interval
+        if self.sampling == "keyframes" and self._last_timestamp is not None:
+            if frame.timestamp - self._last_timestamp < self.interval_seconds:
+                return
+        self._last_timestamp = frame.timestamp
+        # A run of near-identical frames (a static shot) is scored once
+        if not self._duplicates.is_new(frame.analysis):
+            return
+        # Candidates are scored at analysis resolution; rank_frames re-reads the chosen few
+        self._pending.append((frame.timestamp, frame.analysis))
+        if len(self._pending) >= self.feature_engine.batch_size:
+            self._score_pending()
+
+    def _on_coarse_frame(self, frame: Frame) -> None:
+        self._pending.append((frame.timestamp, downscale(frame.image, THUMBNAIL_COARSE_LONG_SIDE)))
+        if len(self._pending) >= self.feature_engine.batch_size:
+            self._score_pending()
+
+    def _score_pending(self) -> None:
+        """Score the buffered frames and keep only their features"""
+        if not self._pending:
+            return
+        engine = self.coarse_engine if self.sampling == "coarse_to_fine" else self.feature_engine
+        features = engine.compute(
+            [image for _, image in self._pending], max(self.source.width, self.source.height)
         )
+        for (timestamp, _), record in zip(self._pending, feature_dicts(features)):
+            self._scored.append({'timestamp': timestamp, 'features': record})
+        self._pending.clear()
+
+    def _refine(self, coarse: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fully score frames around the best coarse candidates"""
+        if not coarse:
+            return []
         
-        has_faces = len(faces) > 0
-        face_count = len(faces)
-        
-        # Calculate prominence (size and position)
-        prominence = 0.0
-        if has_faces:
-            frame_area = frame.shape[0] * frame.shape[1]
-            for (x, y, w, h) in faces:
-                face_area = w * h
-                prominence += (face_area / frame_area) * 100
-            prominence = min(100, prominence)
-        
-        return (has_faces, face_count, float(prominence))
-    
-    def _score_composition(self, frame: np.ndarray) -> float:
-        """Score frame composition using rule of thirds"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        h, w = edges.shape
-        
-        # Rule of thirds intersection points
-        third_h = h // 3
-        third_w = w // 3
-        
-        intersections = [
-            (third_w, third_h),
-            (2 * third_w, third_h),
-            (third_w, 2 * third_h),
-            (2 * third_w, 2 * third_h)
-        ]
-        
-        # Check edge density at intersection points
-        score = 0.0
-        region_size = 50
-        
-        for x, y in intersections:
-            x1 = max(0, x - region_size // 2)
-            x2 = min(w, x + region_size // 2)
-            y1 = max(0, y - region_size // 2)
-            y2 = min(h, y + region_size // 2)
-            
-            region = edges[y1:y2, x1:x2]
-            density = np.sum(region) / (region.size * 255)
-            score += density
+        # Cheap score: every platform's weights averaged; face prominence is zero here
+        cheap = score_frames(coarse, list(PLATFORM_WEIGHTS)).mean(axis=1)
+        
+        # Best first, skipping any within interval_seconds of a better seed
+        seeds: List[float] = []
+        for i in np.argsort(-cheap, kind='stable'):
+            timestamp = coarse[i]['timestamp']
+            if all(abs(timestamp - seed) >= self.interval_seconds for seed in seeds):
+                seeds.append(timestamp)
+                if len(seeds) >= THUMBNAIL_REFINE_SEEDS:
+                    break
+        
+        # Each seed is refined over one coarse interval centred on it, which covers
+        # the frames the coarse pass skipped on either side
+        fps = self.source.fps
+        half = max(1, int(round(fps * THUMBNAIL_COARSE_INTERVAL / 2)))
+        step = max(1, int(round(2 * half / (THUMBNAIL_REFINE_SAMPLES - 1))))
+        windows = []
+        for seed in sorted(seeds):
+            center = int(round(seed * fps))
+            windows.append((center - step * min(half // step, center // step), center + half + 1))
+        # dHash ignores blur, so a run of look-alikes here is what refinement is for:
+        # finding the sharpest frame of it. Score them all
+        refined = score_windows(
+            self.feature_engine, self.video_path, windows, step, fps, skip_duplicates=False
+        )
         
-        # Normalize to 0-100
-        composition_score = min(100, score * 100)
-        return float(composition_score)
+        print(f"✅ Scanned {len(coarse)} coarse frames, refined {len(seeds)} seeds into {len(refined)} candidates")
+        return [{'timestamp': timestamp, 'features': features} for timestamp, features in refined]
+
+    def _read_frame_at(self, timestamp: float) -> Optional[np.ndarray]:
+        """Decode a single frame by timestamp"""
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(round(timestamp * self.source.fps)))
+            ret, frame = cap.read()
+            return frame if ret else None
+        finally:
+            cap.release()
     
-    def _score_color_vibrancy(self, frame: np.ndarray) -> float:
-        """Score color vibrancy and visual appeal"""
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        
-        # Saturation (vibrancy)
-        saturation = hsv[:, :, 1]
-        avg_saturation = np.mean(saturation)
-        
-        # Value (brightness variation)
-        value = hsv[:, :, 2]
-        value_std = np.std(value)
-        
-        # Combine metrics
-        vibrancy_score = (avg_saturation / 2.55) * 0.7 + (value_std / 1.28) * 0.3
-        
-        return float(min(100, vibrancy_score))
+    def _diverse_top(
+        self,
+        scores: np.ndarray,
+        frame_features: List[Dict[str, Any]],
+        num_suggestions: int
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Best frames first, skipping any that look like or sit next to a better pick
+
+        Static footage can give fewer than num_suggestions; look-alikes are never
+        used to pad the list.
+        """
+        # Pop from a heap so only as many candidates as it takes are ordered;
+        # ties keep timestamp order
+        heap = [(-score, i) for i, score in enumerate(scores)]
+        heapq.heapify(heap)
+        picks: List[Tuple[float, Dict[str, Any]]] = []
+        while heap and len(picks) < num_suggestions:
+            neg_score, i = heapq.heappop(heap)
+            frame_data = frame_features[i]
+            if any(
+                abs(frame_data['timestamp'] - picked['timestamp']) < THUMBNAIL_MIN_GAP_SECONDS
+                or hamming(frame_data['features']['dhash'], picked['features']['dhash']) < THUMBNAIL_MIN_DISTANCE_BITS
+                for _, picked in picks
+            ):
+                continue
+            picks.append((-neg_score, frame_data))
+        return picks
     
-    def _detect_text_overlay(self, frame: np.ndarray) -> Tuple[bool, float]:
-        """Detect text/overlays and score visibility"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Use edge detection as proxy for text
-        edges = cv2.Canny(gray, 100, 200)
-        edge_density = np.sum(edges) / (edges.size * 255)
-        
-        # High edge density in specific regions suggests text
-        has_text = edge_density > 0.1
-        visibility_score = min(100, edge_density * 500)
-        
-        return (has_text, float(visibility_score))
+    def _calculate_combined_score(self, features: np.ndarray, platform: str) -> np.ndarray:
+        """Score every candidate at once: (frames x features) matrix times the platform's weights"""
+        return features @ weight_matrix([platform])[:, 0]
     
-    def _calculate_combined_score(
-        self,
-        quality_metrics: Dict[str, float],
-        platform: str
-    ) -> float:
-        """Calculate combined score with platform-specific weights"""
-        
-        # Platform-specific weights
-        if platform == 'instagram':
-            weights = {
-                'sharpness': 0.20,
-                'brightness': 0.15,
-                'contrast': 0.10,
-                'face_prominence': 0.25,  # Instagram loves faces
-                'composition_score': 0.15,
-                'color_vibrancy': 0.15
-            }
-        elif platform == 'youtube_shorts':
-            weights = {
-                'sharpness': 0.25,
-                'brightness': 0.15,
-                'contrast': 0.15,
-                'face_prominence': 0.10,
-                'composition_score': 0.20,  # YouTube values composition
-                'color_vibrancy': 0.15
-            }
-        else:  # other
-            weights = {
-                'sharpness': 0.20,
-                'brightness': 0.15,
-                'contrast': 0.15,
-                'face_prominence': 0.15,
-                'composition_score': 0.20,
-                'color_vibrancy': 0.15
-            }
-        
-        # Calculate weighted score
-        score = 0.0
-        score += quality_metrics['sharpness'] * weights['sharpness']
-        score += quality_metrics['brightness'] * weights['brightness']
-        score += quality_metrics['contrast'] * weights['contrast']
-        score += quality_metrics['face_prominence'] * weights['face_prominence']
-        score += quality_metrics['composition_score'] * weights['composition_score']
-        score += quality_metrics['color_vibrancy'] * weights['color_vibrancy']
-        
-        return float(score)
+    def _generate_previews(self, frame: np.ndarray) -> Dict[str, str]:
+        """Preview URLs by size, or a single inline preview when there is no store"""
+        if self.preview_store is not None:
+            return self.preview_store.save_frame(frame)
+        return {'small': self._generate_preview_image(frame)}
     
     def _generate_preview_image(self, frame: np.ndarray) -> str:
         """Generate thumbnail preview as base64 JPEG"""
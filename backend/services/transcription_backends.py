@@ -0,0 +1,138 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# "whisper" (openai-whisper, float32 PyTorch) or "faster-whisper" (CTranslate2, quantized)
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "whisper").lower()
+# Local model directory for faster-whisper: a converted model in <dir>/<size> is used
+# as is, otherwise the size is downloaded into <dir> once
+WHISPER_MODEL_DIR = os.getenv("WHISPER_MODEL_DIR", "./models")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+
+
+def _result(segments: List[Dict[str, Any]], language: str) -> Dict[str, Any]:
+    """The result dict every backend returns"""
+    return {
+        "text": "".join(seg["text"] for seg in segments),
+        "segments": segments,
+        "language": language or "unknown"
+    }
+
+
+class TranscriptionBackend:
+    """Loads a speech-to-text model and runs it on 16 kHz mono float32 audio
+
+    Backends hold only settings, so they can be sent to worker processes; the loaded
+    model is passed back in to transcribe().
+    """
+
+    name = "base"
+
+    def __init__(self, model_size: str):
+        self.model_size = model_size
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model_size}"
+
+    def load(self, cpu_threads: int = 0) -> Any:
+        raise NotImplementedError
+
+    def transcribe(self, model: Any, audio: np.ndarray, word_timestamps: bool = False) -> Dict[str, Any]:
+        """Return {"text", "segments": [{"start", "end", "text", "words"}], "language"}"""
+        raise NotImplementedError
+
+
+class WhisperBackend(TranscriptionBackend):
+    """openai-whisper in float32 PyTorch"""
+
+    name = "whisper"
+
+    def load(self, cpu_threads: int = 0) -> Any:
+        import whisper
+        if cpu_threads:
+            import torch
+            torch.set_num_threads(cpu_threads)
+        return whisper.load_model(self.model_size)
+
+    def transcribe(self, model: Any, audio: np.ndarray, word_timestamps: bool = False) -> Dict[str, Any]:
+        result = model.transcribe(audio, word_timestamps=word_timestamps)
+        segments = [
+            {
+                "start": seg["start"],
+                "end": seg["end"],
+                "text": seg["text"],
+                "words": [
+                    {"word": w["word"], "start": w["start"], "end": w["end"]}
+                    for w in seg.get("words", [])
+                ]
+            }
+            for seg in result["segments"]
+        ]
+        return _result(segments, result.get("language"))
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 Whisper on CPU with quantized (int8 by default) weights"""
+
+    name = "faster-whisper"
+
+    def __init__(
+        self,
+        model_size: str,
+        model_dir: str = WHISPER_MODEL_DIR,
+        compute_type: str = WHISPER_COMPUTE_TYPE
+    ):
+        super().__init__(model_size)
+        self.model_dir = model_dir
+        self.compute_type = compute_type
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model_size}:{self.compute_type}"
+
+    def load(self, cpu_threads: int = 0) -> Any:
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("TRANSCRIBE_BACKEND=faster-whisper needs the faster-whisper package")
+
+        local_model = Path(self.model_dir) / self.model_size
+        return WhisperModel(
+            str(local_model) if local_model.is_dir() else self.model_size,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=cpu_threads,
+            download_root=self.model_dir
+        )
+
+    def transcribe(self, model: Any, audio: np.ndarray, word_timestamps: bool = False) -> Dict[str, Any]:
+        # Segments come back as a lazy generator; decoding happens while iterating
+        raw_segments, info = model.transcribe(audio, word_timestamps=word_timestamps)
+        segments = [
+            {
+                "start": seg.start,
+                "end": seg.end,
+                "text": seg.text,
+                "words": [
+                    {"word": w.word, "start": w.start, "end": w.end}
+                    for w in (seg.words or [])
+                ]
+            }
+            for seg in raw_segments
+        ]
+        return _result(segments, info.language)
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend
+}
+
+
+def get_backend(model_size: str, name: str = TRANSCRIBE_BACKEND) -> TranscriptionBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown TRANSCRIBE_BACKEND '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_size)
@@ -1,110 +1,86 @@
-import cv2
 import numpy as np
-from pathlib import Path
+from typing import Optional
+
+from services.frame_source import Frame, FrameSource, normalized_laplacian_var
+from services.scene_detector import SceneDetector
 
 class VideoAnalyzer:
-    def __init__(self, video_path: str):
+    def __init__(self, video_path: str, frame_source: Optional[FrameSource] = None):
         self.video_path = video_path
-        self.cap = cv2.VideoCapture(video_path)
-        
+        self.source = frame_source or FrameSource(video_path)
+
+        # Per-metric state, filled in while the shared source decodes
+        self._brightness_values = []
+        self._blur = None
+        self._first_frame = None
+
+        self.source.register(self._on_brightness_frame, stop=30)  # Sample first 30 frames
+        self.source.register(self._on_blur_frame, stop=1)
+        self.source.register(self._on_first_frame, stop=1)
+        # Covers the whole video at a reduced frame rate
+        self.scene_detector = SceneDetector(self.source)
+
     def analyze(self) -> dict:
         """Analyze video quality metrics"""
+        self.source.run()
+        scene_cuts = self.scene_detector.cuts()
         metrics = {
             "duration": self._get_duration(),
             "resolution": self._get_resolution(),
             "fps": self._get_fps(),
             "brightness": self._analyze_brightness(),
             "blur_score": self._analyze_blur(),
-            "scene_changes": self._detect_scene_changes(),
+            "scene_changes": len(scene_cuts),
+            "scene_cuts": [round(t, 3) for t in scene_cuts],
+            "pacing": self.scene_detector.pacing(scene_cuts, self._get_duration()),
             "first_frame_quality": self._analyze_first_frame()
         }
-        self.cap.release()
         return metrics
-    
+
     def _get_duration(self) -> float:
-        fps = self.cap.get(cv2.CAP_PROP_FPS)
-        frame_count = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        return frame_count / fps if fps > 0 else 0
-    
+        return self.source.duration
+
     def _get_resolution(self) -> dict:
-        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        return {"width": width, "height": height}
-    
+        return {"width": self.source.width, "height": self.source.height}
+
     def _get_fps(self) -> float:
-        return self.cap.get(cv2.CAP_PROP_FPS)
-    
+        return self.source.fps
+
+    def _on_brightness_frame(self, frame: Frame) -> None:
+        self._brightness_values.append(np.mean(frame.gray))
+
+    def _on_blur_frame(self, frame: Frame) -> None:
+        self._blur = normalized_laplacian_var(frame.gray, max(frame.image.shape[:2]))
+
+    def _on_first_frame(self, frame: Frame) -> None:
+        self._first_frame = frame
+
     def _analyze_brightness(self) -> dict:
         """Analyze brightness across video"""
-        brightness_values = []
-        frame_count = 0
-        
-        while frame_count < 30:  # Sample first 30 frames
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            brightness_values.append(np.mean(gray))
-            frame_count += 1
-        
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset
-        
+        brightness_values = self._brightness_values
+
         avg_brightness = np.mean(brightness_values) if brightness_values else 0
         return {
             "average": float(avg_brightness),
             "is_dark": avg_brightness < 80,
             "is_bright": avg_brightness > 180
         }
-    
+
     def _analyze_blur(self) -> float:
         """Detect blur using Laplacian variance"""
-        ret, frame = self.cap.read()
-        if not ret:
+        if self._blur is None:
             return 0.0
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset
-        return float(laplacian_var)
-    
-    def _detect_scene_changes(self) -> int:
-        """Count scene changes (simple frame difference)"""
-        scene_changes = 0
-        prev_frame = None
-        frame_count = 0
-        
-        while frame_count < 60:  # Sample frames
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            if prev_frame is not None:
-                diff = cv2.absdiff(prev_frame, gray)
-                if np.mean(diff) > 30:  # Threshold for scene change
-                    scene_changes += 1
-            
-            prev_frame = gray
-            frame_count += 1
-        
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset
-        return scene_changes
-    
+        return float(self._blur)
+
     def _analyze_first_frame(self) -> dict:
         """Analyze first 3 seconds (hook quality)"""
-        ret, frame = self.cap.read()
-        if not ret:
+        if self._first_frame is None:
             return {"quality": "unknown"}
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        gray = self._first_frame.gray
         brightness = np.mean(gray)
-        blur = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset
-        
+        blur = normalized_laplacian_var(gray, max(self._first_frame.image.shape[:2]))
+
         return {
             "brightness": float(brightness),
             "sharpness": float(blur),
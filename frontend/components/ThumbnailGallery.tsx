@@ -3,10 +3,13 @@
 import { Image, Download, Clock, Star, Sparkles } from 'lucide-react'
 import { useState } from 'react'
 
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
+
 interface ThumbnailSuggestion {
   timestamp: number
   score: number
-  preview_image: string
+  preview_image: string | null
+  preview_images?: Record<string, string> | null
   reasoning: string
   is_recommended: boolean
   quality_metrics: {
@@ -24,23 +27,41 @@ interface ThumbnailGalleryProps {
   thumbnails: ThumbnailSuggestion[]
 }
 
-export default function ThumbnailGallery({ thumbnails }: ThumbnailGalleryProps) {
+// Previews are served by the API as relative URLs (older results inline them)
+const previewUrl = (thumbnail: ThumbnailSuggestion, size: string = 'small') => {
+  const url = thumbnail.preview_images?.[size] ?? thumbnail.preview_image
+  if (!url) {
+    return null
+  }
+  return url.startsWith('/') ? `${API_URL}${url}` : url
+}
+
+export default function ThumbnailGallery({ thumbnails: suggestions }: ThumbnailGalleryProps) {
   const [selectedIndex, setSelectedIndex] = useState(0)
 
-  if (!thumbnails || thumbnails.length === 0) {
+  // Results cached by older versions can hold suggestions whose frame had no preview
+  const thumbnails = (suggestions ?? []).filter((thumbnail) => previewUrl(thumbnail) !== null)
+  if (thumbnails.length === 0) {
     return null
   }
 
-  const selectedThumbnail = thumbnails[selectedIndex]
+  const selectedThumbnail = thumbnails[Math.min(selectedIndex, thumbnails.length - 1)]
 
-  const handleDownload = (thumbnail: ThumbnailSuggestion, index: number) => {
-    // Create download link
+  const handleDownload = async (thumbnail: ThumbnailSuggestion, index: number) => {
+    const url = previewUrl(thumbnail, 'large')
+    if (!url) {
+      return
+    }
+    // The download attribute is ignored for cross-origin URLs, so fetch the image first
+    const blob = await (await fetch(url)).blob()
+    const extension = blob.type === 'image/webp' ? 'webp' : 'jpg'
     const link = document.createElement('a')
-    link.href = thumbnail.preview_image
-    link.download = `thumbnail-${index + 1}-${thumbnail.timestamp.toFixed(1)}s.jpg`
+    link.href = URL.createObjectURL(blob)
+    link.download = `thumbnail-${index + 1}-${thumbnail.timestamp.toFixed(1)}s.${extension}`
     document.body.appendChild(link)
     link.click()
     document.body.removeChild(link)
+    URL.revokeObjectURL(link.href)
   }
 
   const formatTime = (seconds: number) => {
@@ -95,7 +116,7 @@ export default function ThumbnailGallery({ thumbnails }: ThumbnailGalleryProps)
             {/* Image */}
             <div className="relative aspect-video rounded-xl overflow-hidden border-2 border-white/10">
               <img
-                src={selectedThumbnail.preview_image}
+                src={previewUrl(selectedThumbnail, 'large') ?? undefined}
                 alt={`Thumbnail at ${formatTime(selectedThumbnail.timestamp)}`}
                 className="w-full h-full object-cover"
               />
@@ -185,7 +206,7 @@ export default function ThumbnailGallery({ thumbnails }: ThumbnailGalleryProps)
 
               {/* Image */}
               <img
-                src={thumbnail.preview_image}
+                src={previewUrl(thumbnail) ?? undefined}
                 alt={`Thumbnail ${index + 1}`}
                 className="w-full h-full object-cover"
               />